@@ -1,38 +1,59 @@
+from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, Header, Query
-from typing import Dict, List, Optional
-from ..models.proxy import Proxy, ProxyStatus
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from typing import Any, Dict, List, Optional, Union
+from ..models.job import Job
+from ..models.retention import RetentionReport
+from ..models.sync import ProxyChanges, SubscriptionFilter
+from ..models.proxy import Proxy, ProxyDiversity, ProxyHistoryBucket, ProxyProtocol, ProxyReport, ProxyStatus, ProxyValidationResult
 from ..services.proxy_service import ProxyService
+from ..services.dead_proxy_cache import DeadProxyCache
+from ..services.geo_service import GeoService
+from ..services.history_service import HistoryService
+from ..services.job_service import JobService
+from ..services.rescoring_service import RescoringService
+from ..services.retention_service import RetentionService
+from ..services.stats_service import StatsService
 from ..services.scraper_service import ScraperService
+from ..services.snapshot_service import SnapshotService
+from ..services.subscription_service import SubscriptionService
+from ..services.sync_service import SyncService
 from ..validators.proxy_validator import ProxyValidator
 from ..core.config import settings
+from ..core.profiling import LoopLagMonitor, ProfilingMiddleware, StackSampler, phase
+from ..db.mongodb import slow_command_listener
 
 router = APIRouter()
 
-def verify_api_key(x_api_key: str = Header(...)):
+async def verify_api_key(x_api_key: str = Header(...)):
     """Verify the API key from header"""
-    if x_api_key != settings.API_KEY:
-        raise HTTPException(status_code=401, detail="Invalid API Key")
+    # Dependencia async: una comprobación síncrona se ejecutaría en el threadpool en cada petición
+    with phase("auth"):
+        if x_api_key != settings.API_KEY:
+            raise HTTPException(status_code=401, detail="Invalid API Key")
     return x_api_key
 
 @router.get("/proxy", response_model=Proxy)
 async def get_proxy(
     status: Optional[ProxyStatus] = Query(ProxyStatus.ACTIVE),
     min_score: int = Query(50, ge=0, le=100),
+    protocol: Optional[ProxyProtocol] = Query(None, description="Only proxies supporting this protocol"),
+    country: Optional[str] = Query(None, min_length=2, max_length=2, description="ISO 3166-1 alpha-2 country code"),
+    asn: Optional[int] = Query(None, ge=1, description="Autonomous system number"),
     include_history: bool = Query(False, description="Include validation history"),
     api_key: str = Depends(verify_api_key)
 ):
     """Get a single valid proxy"""
-    proxies = await ProxyService.get_proxies(status=status, min_score=min_score, limit=1)
+    proxies = await ProxyService.get_proxies(status=status, min_score=min_score, limit=1, protocol=protocol,
+                                             country=country, asn=asn)
     if not proxies:
         raise HTTPException(status_code=404, detail="No valid proxies found")
     
     proxy = proxies[0]
     
-    # Si no se solicita el historial, eliminarlo
-    if not include_history:
-        proxy_dict = proxy.dict()
-        proxy_dict["validation_history"] = []
-        return Proxy(**proxy_dict)
+    # El historial se consulta aparte, solo si se solicita; en modo degradado no hay MongoDB
+    if include_history and not SnapshotService.is_degraded():
+        proxy.validation_history = await HistoryService.get_history(proxy.ip, proxy.port, limit=20)
     
     return proxy
 
@@ -41,12 +62,79 @@ async def get_proxies(
     status: Optional[ProxyStatus] = Query(ProxyStatus.ACTIVE),
     min_score: int = Query(50, ge=0, le=100),
     limit: int = Query(10, ge=1, le=100),
+    protocol: Optional[ProxyProtocol] = Query(None, description="Only proxies supporting this protocol"),
+    country: Optional[str] = Query(None, min_length=2, max_length=2, description="ISO 3166-1 alpha-2 country code"),
+    asn: Optional[int] = Query(None, ge=1, description="Autonomous system number"),
+    diversity: Optional[ProxyDiversity] = Query(None, description="Spread the batch across subnets (/24, /48) or ASNs"),
+    max_per_group: int = Query(1, ge=1, le=100, description="Maximum proxies from one subnet or ASN when diversity is set"),
     api_key: str = Depends(verify_api_key)
 ):
-    """Get multiple proxies filtered by status and score"""
-    proxies = await ProxyService.get_proxies(status=status, min_score=min_score, limit=limit)
+    """Get multiple proxies filtered by status, score, protocol, country and ASN, optionally spread across networks"""
+    proxies = await ProxyService.get_proxies(status=status, min_score=min_score, limit=limit, protocol=protocol,
+                                             country=country, asn=asn, diversity=diversity,
+                                             max_per_group=max_per_group)
     return proxies
 
+@router.get("/proxy/{ip}/{port}/history", response_model=Union[List[ProxyHistoryBucket], List[ProxyValidationResult]])
+async def get_proxy_history(
+    ip: str,
+    port: int,
+    start: Optional[datetime] = Query(None, description="Inclusive start of the time range"),
+    end: Optional[datetime] = Query(None, description="Exclusive end of the time range"),
+    bucket: Optional[int] = Query(None, ge=1, description="Downsample into buckets of this many seconds"),
+    limit: int = Query(100, ge=1, le=1000),
+    api_key: str = Depends(verify_api_key)
+):
+    """Get the validation and usage history of a proxy, most recent first"""
+    return await HistoryService.get_history(ip, port, start=start, end=end, bucket_seconds=bucket, limit=limit)
+
+@router.get("/proxies/export")
+async def export_proxies(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    status: Optional[ProxyStatus] = Query(None),
+    min_score: int = Query(0, ge=0, le=100),
+    api_key: str = Depends(verify_api_key)
+):
+    """Stream the whole pool; X-Sync-Cursor is the starting point for /proxies/changes"""
+    # El cursor se toma antes de leer: lo que cambie durante la exportación llega en el siguiente delta
+    cursor = SyncService.watermark()
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        SyncService.export(format, status=status, min_score=min_score),
+        media_type=media_type,
+        headers={"X-Sync-Cursor": str(cursor)}
+    )
+
+@router.get("/proxies/changes", response_model=ProxyChanges)
+async def get_proxy_changes(
+    since: int = Query(..., ge=0, description="Cursor from the export or the previous call"),
+    limit: int = Query(1000, ge=1, le=settings.SYNC_CHANGES_MAX_LIMIT),
+    api_key: str = Depends(verify_api_key)
+):
+    """Get proxies added, updated, rescored or removed since a sync cursor"""
+    return await SyncService.get_changes(since, limit=limit)
+
+@router.get("/proxies/subscribe")
+async def subscribe_proxies(
+    status: Optional[ProxyStatus] = Query(ProxyStatus.ACTIVE),
+    min_score: int = Query(0, ge=0, le=100),
+    protocol: Optional[ProxyProtocol] = Query(None, description="Only proxies supporting this protocol"),
+    country: Optional[str] = Query(None, min_length=2, max_length=2),
+    api_key: str = Depends(verify_api_key)
+):
+    """Server-sent events with the proxies that enter (upsert) or leave (remove) the filter"""
+    subscriber = SubscriptionService.subscribe(
+        SubscriptionFilter(status=status, min_score=min_score, protocol=protocol, country=country)
+    )
+    if subscriber is None:
+        raise HTTPException(status_code=503, detail="Too many subscribers")
+
+    return StreamingResponse(
+        SubscriptionService.stream(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/proxy", response_model=bool)
 async def add_proxy(
     proxy: Proxy,
@@ -77,12 +165,31 @@ async def report_proxy_result(
     )
     return success
 
+@router.post("/proxy/report/batch", response_model=int)
+async def report_proxy_results(
+    reports: List[ProxyReport],
+    api_key: str = Depends(verify_api_key)
+):
+    """Report the results of using several proxies, returning how many were applied"""
+    if len(reports) > settings.REPORT_BATCH_MAX_SIZE:
+        raise HTTPException(status_code=413, detail=f"At most {settings.REPORT_BATCH_MAX_SIZE} reports per batch")
+    return await ProxyService.report_proxy_results(reports)
+
+@router.get("/stats", response_model=Dict[str, Any])
+async def get_stats(api_key: str = Depends(verify_api_key)):
+    """Get pool statistics by status, source, country, protocol and score, served from memory"""
+    return {**StatsService.get_stats(), "database": settings.MONGODB_DB}
+
+@router.get("/dead-proxies/stats", response_model=Dict[str, float])
+async def get_dead_proxy_cache_stats(api_key: str = Depends(verify_api_key)):
+    """Get hit metrics of the negative cache of recently deleted proxies"""
+    return DeadProxyCache.get_metrics()
+
 # Scraping endpoints
-@router.post("/scrape/all", response_model=int)
+@router.post("/scrape/all", response_model=Job, status_code=202)
 async def scrape_all_sources(api_key: str = Depends(verify_api_key)):
-    """Scrape proxies from all registered sources"""
-    total_added = await ScraperService.scrape_all()
-    return total_added
+    """Start a job scraping proxies from all registered sources"""
+    return JobService.submit("scrape_all", lambda progress: ScraperService.scrape_all(progress=progress))
 
 @router.post("/scrape/{source_name}", response_model=int)
 async def scrape_source(
@@ -97,14 +204,17 @@ async def scrape_source(
         raise HTTPException(status_code=404, detail=str(e))
 
 # Validation endpoints
-@router.post("/validate/all", response_model=Dict[str, int])
+@router.post("/validate/all", response_model=Job, status_code=202)
 async def validate_all_proxies(
     batch_size: int = Query(10, ge=1, le=50),
     api_key: str = Depends(verify_api_key)
 ):
-    """Validate all proxies in the database"""
-    results = await ProxyValidator.validate_all(batch_size=batch_size)
-    return results
+    """Start a job validating all proxies in the database"""
+    return JobService.submit(
+        "validate_all",
+        lambda progress: ProxyValidator.validate_all(batch_size=batch_size, progress=progress),
+        params={"batch_size": batch_size}
+    )
 
 @router.post("/validate/{ip}/{port}", response_model=bool)
 async def validate_proxy(
@@ -124,4 +234,74 @@ async def validate_proxy(
     
     # Validate the proxy
     result = await ProxyValidator.validate_and_update(proxy)
-    return result
\ No newline at end of file
+    return result
+
+@router.post("/rescore", response_model=Job, status_code=202)
+async def rescore_proxies(api_key: str = Depends(verify_api_key)):
+    """Start a job rescoring the whole pool with time decay"""
+    return JobService.submit("rescore", lambda progress: RescoringService.rescore_all(progress=progress))
+
+@router.post("/geo/backfill", response_model=Job, status_code=202)
+async def backfill_geo(api_key: str = Depends(verify_api_key)):
+    """Start a job resolving the country and ASN of every stored proxy again"""
+    return JobService.submit("geo_backfill", lambda progress: GeoService.backfill(progress=progress))
+
+# Retention endpoints
+@router.post("/retention/run", response_model=Job, status_code=202)
+async def run_retention(api_key: str = Depends(verify_api_key)):
+    """Start a job applying all enabled retention policies, scheduled or not"""
+    return JobService.submit(
+        "retention",
+        lambda progress: RetentionService.run(progress=progress),
+        params={"scheduled_only": False}
+    )
+
+@router.get("/retention/report", response_model=RetentionReport)
+async def get_retention_report(api_key: str = Depends(verify_api_key)):
+    """Get the report of the most recent retention run"""
+    report = RetentionService.get_last_report()
+    if not report:
+        raise HTTPException(status_code=404, detail="Retention has not run yet")
+    return report
+
+# Job endpoints
+@router.get("/jobs", response_model=List[Job])
+async def list_jobs(api_key: str = Depends(verify_api_key)):
+    """List background jobs, most recent first"""
+    return JobService.list()
+
+@router.get("/jobs/{job_id}", response_model=Job)
+async def get_job(
+    job_id: str,
+    api_key: str = Depends(verify_api_key)
+):
+    """Get the status, progress, throughput and ETA of a background job"""
+    job = JobService.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+# Profiling endpoints
+
+@router.get("/profiling/stats", response_model=Dict[str, Any])
+async def get_profiling_stats(api_key: str = Depends(verify_api_key)):
+    """Average request phases per route, event-loop lag and slow MongoDB operations"""
+    if not settings.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    return {
+        "requests": ProfilingMiddleware.get_stats(),
+        "event_loop": LoopLagMonitor.get_stats(),
+        "slow_mongodb_operations": slow_command_listener.slow_count if slow_command_listener else 0
+    }
+
+@router.post("/profiling/profile", response_class=PlainTextResponse)
+async def profile(
+    seconds: float = Query(10, gt=0, le=settings.PROFILING_MAX_DURATION),
+    api_key: str = Depends(verify_api_key)
+):
+    """Sample the event-loop stack for some seconds and return collapsed stacks (flamegraph format)"""
+    try:
+        stacks = await StackSampler.profile(seconds)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return "\n".join(stacks) + "\n"
@@ -0,0 +1,54 @@
+import hashlib
+import math
+from typing import Optional
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings, backed by a bytearray"""
+
+    def __init__(self, capacity: int, false_positive_rate: float, bits: Optional[bytes] = None, count: int = 0):
+        """
+        Args:
+            capacity: Expected number of items
+            false_positive_rate: Target false positive probability at capacity
+            bits: Serialized bit array to restore, or None for an empty filter
+            count: Number of items already added to the restored bit array
+        """
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        if not 0 < false_positive_rate < 1:
+            raise ValueError("false_positive_rate must be between 0 and 1")
+
+        # Tamaño y número de hashes óptimos: m = -n·ln(p)/ln(2)², k = m/n·ln(2)
+        self.size = max(8, int(math.ceil(-capacity * math.log(false_positive_rate) / (math.log(2) ** 2))))
+        self.hash_count = max(1, int(round(self.size / capacity * math.log(2))))
+        self.capacity = capacity
+        self.count = count
+
+        num_bytes = (self.size + 7) // 8
+        if bits is not None and len(bits) == num_bytes:
+            self.bits = bytearray(bits)
+        else:
+            self.bits = bytearray(num_bytes)
+            self.count = 0
+
+    def _positions(self, key: str):
+        # Doble hashing (Kirsch-Mitzenmacher) a partir de un único digest
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str) -> None:
+        """Add a key to the filter"""
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def to_bytes(self) -> bytes:
+        """Serialize the bit array"""
+        return bytes(self.bits)
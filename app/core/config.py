@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings
 from pydantic import Field
 from dotenv import load_dotenv
@@ -16,6 +16,9 @@ class Settings(BaseSettings):
     # MongoDB Settings
     MONGODB_URL: str = Field(default="mongodb://localhost:27017")
     MONGODB_DB: str = Field(default="proxy_service")
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS: int = Field(default=5000)  # Detectar caídas de MongoDB rápidamente
+    MONGODB_RECONNECT_INTERVAL: int = Field(default=15)  # Reintento de conexión en modo degradado
+    MONGODB_READ_TIMEOUT_MS: int = Field(default=1000)  # Lecturas de proxies más lentas pasan al snapshot (si hay uno cargado)
     
     # Proxy Settings
     PROXY_VALIDATION_INTERVAL: int = Field(default=3600)  # Validar proxies cada hora
@@ -24,6 +27,95 @@ class Settings(BaseSettings):
     
     # Configuración de scraping
     SCRAPING_INTERVAL: int = Field(default=6 * 3600)  # 6 horas
+    GEONODE_FULL_RESYNC_INTERVAL: int = Field(default=24 * 3600)  # Recorrido completo de Geonode cada 24 horas
+    
+    # Reevaluación periódica de puntuaciones con decaimiento temporal
+    RESCORE_INTERVAL: int = Field(default=3600)  # Recalcular puntuaciones cada hora
+    RESCORE_HALF_LIFE_HOURS: float = Field(default=24.0)  # La puntuación se reduce a la mitad cada 24h sin comprobar
+    RESCORE_PRIOR_WEIGHT: float = Field(default=5.0)  # Peso (en observaciones) de la fiabilidad de la fuente
+    RESCORE_LATENCY_SAMPLE_SIZE: int = Field(default=10_000)  # Muestra para normalizar latencias por percentil
+    RESCORE_CHUNK_SIZE: int = Field(default=50_000)  # Proxies procesados por lote
+    RESCORE_MIN_DELTA: int = Field(default=2)  # Cambio mínimo de puntuación para escribirlo
+    RESCORE_MAX_WRITES: Optional[int] = Field(default=200_000)  # Máximo de escrituras por ejecución
+    
+    # Snapshot binario del pool para arranque en caliente y caídas de MongoDB
+    SNAPSHOT_PATH: str = Field(default="data/pool_snapshot.bin")
+    SNAPSHOT_INTERVAL: int = Field(default=300)  # Reescribir el snapshot cada 5 minutos
+    SNAPSHOT_STATUSES: List[str] = Field(default=["active"])  # Estados que se consideran servibles
+    SNAPSHOT_MIN_SCORE: int = Field(default=0)
+    
+    # Estadísticas del pool
+    STATS_RECONCILE_INTERVAL: int = Field(default=600)  # Recalcular contadores cada 10 minutos
+    
+    # Jobs en segundo plano (scraping y validación completos)
+    JOB_MAX_CONCURRENCY: int = Field(default=2)  # Jobs ejecutándose a la vez
+    JOB_HISTORY_SIZE: int = Field(default=100)  # Jobs terminados que se recuerdan
+    
+    # Historial de validaciones y usos (colección time-series)
+    PROXY_HISTORY_RETENTION: int = Field(default=30 * 24 * 3600)  # Conservar eventos 30 días
+    PROXY_HISTORY_BATCH_SIZE: int = Field(default=500)  # Eventos por escritura en bloque
+    PROXY_HISTORY_FLUSH_INTERVAL: int = Field(default=5)  # Segundos entre escrituras del buffer
+    
+    # Retención: políticas declarativas de borrado de proxies
+    RETENTION_POLICIES: List[Dict] = Field(default=[
+        {
+            # Fallan repetidamente y no funcionan desde hace 3 días
+            "name": "stale_failing",
+            "filter": {"status": "inactive", "fail_count": {"$gt": 3}},
+            "age_field": "last_checked",
+            "max_age_seconds": 3 * 24 * 3600
+        },
+        {
+            # Fallan de forma persistente y tienen puntuación baja
+            "name": "consistently_failing",
+            "filter": {"status": "inactive", "fail_count": {"$gt": 5}, "score": {"$lt": 20}},
+            "scheduled": False  # Solo con /retention/run
+        }
+    ])
+    RETENTION_BATCH_SIZE: int = Field(default=1000)  # Proxies borrados por lote
+    RETENTION_BATCH_DELAY: float = Field(default=0.05)  # Pausa entre lotes (segundos)
+    RETENTION_ARCHIVE_ENABLED: bool = Field(default=False)  # Guardar lápidas de los proxies borrados
+    RETENTION_ARCHIVE_TTL: int = Field(default=30 * 24 * 3600)  # Conservar lápidas 30 días
+    
+    # Caché negativa de proxies eliminados (filtro Bloom por generaciones)
+    DEAD_PROXY_CACHE_ENABLED: bool = Field(default=True)
+    DEAD_PROXY_CACHE_EXPIRY: int = Field(default=7 * 24 * 3600)  # Ignorar proxies muertos durante 7 días
+    DEAD_PROXY_CACHE_GENERATIONS: int = Field(default=7)
+    DEAD_PROXY_CACHE_CAPACITY: int = Field(default=200_000)  # Entradas esperadas por generación
+    DEAD_PROXY_CACHE_FALSE_POSITIVE_RATE: float = Field(default=0.01)  # De una consulta sobre todas las generaciones
+    
+    # Delta sync and export settings
+    SYNC_SEQUENCE_BLOCK: int = Field(default=1000)  # Números de secuencia reservados por viaje a MongoDB
+    SYNC_TOMBSTONE_RETENTION: int = Field(default=7 * 24 * 3600)  # 7 días; cursores más antiguos requieren exportación completa
+    SYNC_EXPORT_BATCH_SIZE: int = Field(default=1000)
+    SYNC_CHANGES_MAX_LIMIT: int = Field(default=10000)
+    SYNC_LEASE_TIMEOUT: int = Field(default=30)  # Segundos sin renovar tras los que otro proceso puede tomar el lease
+    
+    # Push subscription settings
+    SUBSCRIPTION_BUFFER_SIZE: int = Field(default=1000)  # Eventos de retraso permitidos antes de desconectar al suscriptor
+    SUBSCRIPTION_HEARTBEAT: int = Field(default=15)  # Segundos
+    SUBSCRIPTION_MAX_SUBSCRIBERS: int = Field(default=10000)
+    
+    # Client report settings
+    REPORT_BATCH_MAX_SIZE: int = Field(default=1000)
+    REPORT_BATCH_CONCURRENCY: int = Field(default=20)  # Proxies de un lote actualizados a la vez
+    
+    # Profiling settings
+    PROFILING_ENABLED: bool = Field(default=False)  # Middleware de tiempos, monitor del event loop y log de consultas lentas
+    PROFILING_SLOW_REQUEST_MS: int = Field(default=200)
+    PROFILING_LOOP_LAG_INTERVAL: float = Field(default=0.1)  # Segundos
+    PROFILING_LOOP_LAG_THRESHOLD_MS: int = Field(default=100)
+    PROFILING_MAX_DURATION: int = Field(default=60)  # Segundos máximos de un muestreo bajo demanda
+    MONGODB_SLOW_QUERY_MS: int = Field(default=100)
+
+    # Geo/ASN enrichment settings
+    GEO_DB_PATHS: List[str] = Field(default=[])  # Bases MMDB, TSV (iptoasn) o CSV; vacío desactiva el enriquecimiento
+    GEO_CACHE_SIZE: int = Field(default=65536)  # Bloques /24 resueltos en caché
+    GEO_BACKFILL_BATCH_SIZE: int = Field(default=1000)  # Proxies leídos y actualizados por lote al reprocesar el pool
+
+    # Diversity-aware selection settings
+    DIVERSITY_CANDIDATE_FACTOR: int = Field(default=10)  # Candidatos leídos por proxy pedido
+    DIVERSITY_MAX_CANDIDATES: int = Field(default=2000)
 
     model_config = {
         "env_file": ".env"
@@ -0,0 +1,88 @@
+import socket
+from typing import Callable, Dict, Generic, Hashable, Iterable, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+def subnet_key(ip: str) -> bytes:
+    """Network prefix shared by proxies likely to be banned together: /24 for IPv4, /48 for IPv6"""
+    try:
+        return socket.inet_pton(socket.AF_INET, ip)[:3]
+    except OSError:
+        pass
+    try:
+        return socket.inet_pton(socket.AF_INET6, ip)[:6]
+    except OSError:
+        return ip.encode()
+
+def group_key(diversity: str, subnet: bytes, asn: Optional[int]) -> Hashable:
+    """Group of a proxy for the "subnet" or "asn" diversity mode"""
+    # Sin ASN conocido se agrupa por subred para no juntar todos los desconocidos
+    if diversity == "asn" and asn:
+        return asn
+    return subnet
+
+class DiverseSelection(Generic[T]):
+    """
+    Incremental round-robin selection across groups of score-ordered candidates
+
+    Candidates are added one by one, best first, so they can be read from a
+    cursor that is closed as soon as add() returns False.
+    """
+
+    def __init__(self, key: Callable[[T], Hashable], limit: int, max_per_group: int = 1):
+        self.key = key
+        self.limit = limit
+        self.max_per_group = max_per_group
+        self.groups: Dict[Hashable, List[T]] = {}
+
+    def add(self, item: T) -> bool:
+        """
+        Add the next candidate
+
+        Returns:
+            bool: False once further candidates cannot change the selection
+        """
+        group = self.key(item)
+        members = self.groups.get(group)
+        if members is None:
+            self.groups[group] = [item]
+        elif len(members) < self.max_per_group:
+            members.append(item)
+        # Con limit grupos la primera ronda ya llena el resultado: el resto no se usaría
+        return len(self.groups) < self.limit
+
+    def selected(self) -> List[T]:
+        """Round r takes the r-th best member of every group, groups ordered by their best score"""
+        selected: List[T] = []
+        for position in range(self.max_per_group):
+            for members in self.groups.values():
+                if position < len(members):
+                    selected.append(members[position])
+                    if len(selected) >= self.limit:
+                        return selected
+        return selected
+
+def select_diverse(items: Iterable[T], key: Callable[[T], Hashable], limit: int, max_per_group: int = 1) -> List[T]:
+    """
+    Round-robin selection across groups of score-ordered candidates
+
+    Candidates are grouped in one pass, each group keeping its best
+    max_per_group members in score order. Round r then takes the r-th best
+    member of every group, groups ordered by their best score, until limit is
+    reached. Fewer than limit items are returned when the candidates do not
+    span enough groups.
+
+    Args:
+        items: Candidates sorted by score, best first
+        key: Group of a candidate
+        limit: Maximum number of items returned
+        max_per_group: Maximum items taken from one group
+
+    Returns:
+        List[T]: Selected items, best of each group first
+    """
+    selection = DiverseSelection(key, limit, max_per_group)
+    for item in items:
+        if not selection.add(item):
+            break
+    return selection.selected()
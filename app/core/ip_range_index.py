@@ -0,0 +1,101 @@
+import bisect
+import ipaddress
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+# (inicio, fin, país, asn, organización) con las direcciones como enteros
+IpRange = Tuple[int, int, Optional[str], Optional[int], Optional[str]]
+
+# (país, asn, organización)
+IpInfo = Tuple[Optional[str], Optional[int], Optional[str]]
+
+class IpRangeIndex:
+    """
+    Sorted, non-overlapping IP ranges searchable by binary search
+
+    IPv4 ranges live in numpy arrays (starts, ends and small integer codes for
+    country and organization) so single lookups are one searchsorted and
+    batches are vectorized. IPv6 ranges, rare in proxy lists, use bisect over
+    Python lists.
+    """
+
+    def __init__(self, ranges: Iterable[IpRange]):
+        v4: List[IpRange] = []
+        v6: List[IpRange] = []
+        for entry in ranges:
+            (v4 if entry[1] <= 0xFFFFFFFF else v6).append(entry)
+        v4.sort(key=lambda entry: entry[0])
+        v6.sort(key=lambda entry: entry[0])
+
+        # Tablas de valores distintos; el código 0 significa desconocido
+        self.countries: List[Optional[str]] = [None]
+        self.orgs: List[Optional[str]] = [None]
+        country_codes: Dict[str, int] = {}
+        org_codes: Dict[str, int] = {}
+
+        def code(value: Optional[str], table: List[Optional[str]], codes: Dict[str, int]) -> int:
+            if not value:
+                return 0
+            if value not in codes:
+                codes[value] = len(table)
+                table.append(value)
+            return codes[value]
+
+        count = len(v4)
+        self.starts = np.fromiter((entry[0] for entry in v4), dtype=np.uint32, count=count)
+        self.ends = np.fromiter((entry[1] for entry in v4), dtype=np.uint32, count=count)
+        self.country_codes = np.fromiter((code(entry[2], self.countries, country_codes) for entry in v4),
+                                         dtype=np.uint16, count=count)
+        self.asns = np.fromiter((entry[3] or 0 for entry in v4), dtype=np.uint32, count=count)
+        self.org_codes = np.fromiter((code(entry[4], self.orgs, org_codes) for entry in v4),
+                                     dtype=np.uint32, count=count)
+
+        self.v6_starts = [entry[0] for entry in v6]
+        self.v6_entries = v6
+
+    def __len__(self) -> int:
+        return len(self.starts) + len(self.v6_entries)
+
+    def find_v4(self, ip: int) -> int:
+        """Position of the IPv4 range containing ip, or -1"""
+        i = int(np.searchsorted(self.starts, ip, side="right")) - 1
+        if i >= 0 and ip <= self.ends[i]:
+            return i
+        return -1
+
+    def find_v4_many(self, ips: np.ndarray) -> np.ndarray:
+        """Vectorized find_v4 over a uint32 array"""
+        positions = np.searchsorted(self.starts, ips, side="right") - 1
+        valid = positions >= 0
+        clipped = np.where(valid, positions, 0)
+        if len(self.ends):
+            valid &= ips <= self.ends[clipped]
+        else:
+            valid[:] = False
+        return np.where(valid, positions, -1)
+
+    def info_v4(self, i: int) -> IpInfo:
+        asn = int(self.asns[i])
+        return self.countries[self.country_codes[i]], asn or None, self.orgs[self.org_codes[i]]
+
+    def covers_v4(self, i: int, start: int, end: int) -> bool:
+        """Whether range i contains the whole [start, end] block"""
+        return i >= 0 and self.starts[i] <= start and end <= self.ends[i]
+
+    def lookup(self, ip: str) -> Optional[IpInfo]:
+        """Country, ASN and organization of an address, or None if no range contains it"""
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+
+        value = int(address)
+        if address.version == 4:
+            i = self.find_v4(value)
+            return self.info_v4(i) if i >= 0 else None
+
+        i = bisect.bisect_right(self.v6_starts, value) - 1
+        if i >= 0 and value <= self.v6_entries[i][1]:
+            _, _, country, asn, org = self.v6_entries[i]
+            return country, asn, org
+        return None
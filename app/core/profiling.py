@@ -0,0 +1,312 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+from loguru import logger
+from pymongo import monitoring
+
+from .config import settings
+
+HTTP_METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+UNMATCHED = "<unmatched>"
+
+# Fases de la petición en curso; None fuera de una petición o con el profiling desactivado
+_phases: ContextVar[Optional[Dict[str, float]]] = ContextVar("profiling_phases", default=None)
+
+class _Phase:
+    __slots__ = ("name", "phases", "start")
+
+    def __init__(self, name: str, phases: Dict[str, float]):
+        self.name = name
+        self.phases = phases
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.phases[self.name] = self.phases.get(self.name, 0.0) + time.perf_counter() - self.start
+        return False
+
+class _NoPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NO_PHASE = _NoPhase()
+
+def phase(name: str):
+    """
+    Time a phase of the current request (auth, db, serialization, ...)
+
+    Usage:
+        with phase("db"):
+            docs = await cursor.to_list(length=limit)
+
+    Outside a profiled request this returns a shared no-op context manager.
+    """
+    phases = _phases.get()
+    if phases is None:
+        return _NO_PHASE
+    return _Phase(name, phases)
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware timing every request and its phases
+
+    Adds a Server-Timing header, logs requests slower than
+    PROFILING_SLOW_REQUEST_MS with their breakdown and keeps per-route totals.
+    Only installed when PROFILING_ENABLED is set.
+    """
+
+    _stats: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        phases: Dict[str, float] = {}
+        token = _phases.set(phases)
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                # Las cabeceras salen antes del cuerpo: se incluye lo medido hasta aquí
+                elapsed = time.perf_counter() - start
+                timing = ", ".join(
+                    [f"{name};dur={seconds * 1000:.2f}" for name, seconds in phases.items()]
+                    + [f"total;dur={elapsed * 1000:.2f}"]
+                )
+                message.setdefault("headers", []).append((b"server-timing", timing.encode("latin-1")))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _phases.reset(token)
+            elapsed = time.perf_counter() - start
+            # Plantilla de la ruta (/api/proxy/{ip}/{port}) para no crear una entrada por URL;
+            # route.path no incluye el prefijo del router, que se toma de la URL.
+            # Las URLs sin ruta (404, escaneos) y los métodos no estándar comparten una entrada
+            path = UNMATCHED
+            route = scope.get("route")
+            if route is not None:
+                segments = scope.get("path", "").split("/")
+                path = "/".join(segments[:len(segments) - route.path.count("/")]) + route.path
+            method = scope.get("method", "")
+            if method not in HTTP_METHODS:
+                method = "OTHER"
+            self._record(f"{method} {path}", elapsed, phases)
+
+    @classmethod
+    def _record(cls, key: str, elapsed: float, phases: Dict[str, float]) -> None:
+        stats = cls._stats[key]
+        stats["count"] += 1
+        stats["total_ms"] += elapsed * 1000
+        stats["max_ms"] = max(stats["max_ms"], elapsed * 1000)
+        for name, seconds in phases.items():
+            stats[f"{name}_ms"] += seconds * 1000
+
+        if elapsed * 1000 >= settings.PROFILING_SLOW_REQUEST_MS:
+            breakdown = " ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in phases.items())
+            other = (elapsed - sum(phases.values())) * 1000
+            logger.warning(f"Slow request {key}: {elapsed * 1000:.1f}ms ({breakdown} other={other:.1f}ms)")
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Dict[str, float]]:
+        """Average milliseconds per route and phase since startup"""
+        result = {}
+        for key, stats in cls._stats.items():
+            count = stats["count"]
+            result[key] = {"count": int(count), "max_ms": round(stats["max_ms"], 2)}
+            for name, value in stats.items():
+                if name.endswith("_ms") and name != "max_ms":
+                    result[key][f"avg_{name}"] = round(value / count, 2)
+        return result
+
+def install_serialization_timing() -> None:
+    """
+    Time FastAPI's response_model validation and encoding as the serialization phase
+
+    FastAPI resolves serialize_response from its module on every request, so
+    wrapping it there covers all routes without touching them.
+    """
+    from fastapi import routing
+
+    original = routing.serialize_response
+    if getattr(original, "_profiled", False):
+        return
+
+    async def serialize_response(*args, **kwargs):
+        with phase("serialization"):
+            return await original(*args, **kwargs)
+
+    serialize_response._profiled = True
+    routing.serialize_response = serialize_response
+
+def query_shape(value: Any) -> Any:
+    """Replace the literal values of a MongoDB filter by their type, keeping operators and fields"""
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        # Los arrays de valores ($in, $nin) se resumen en un solo elemento
+        shapes = [query_shape(item) for item in value[:3]]
+        if shapes and all(shape == shapes[0] for shape in shapes):
+            return [shapes[0]]
+        return shapes
+    return type(value).__name__
+
+class SlowCommandListener(monitoring.CommandListener):
+    """
+    pymongo command listener logging slow operations with their filter shape
+
+    Registered on the motor client only when PROFILING_ENABLED is set. The
+    callbacks run in motor's worker threads.
+    """
+
+    # Campo del comando que contiene el filtro de cada operación
+    FILTER_FIELDS = {"find": "filter", "count": "query", "distinct": "query", "findAndModify": "query",
+                     "aggregate": "pipeline", "update": "updates", "delete": "deletes"}
+
+    def __init__(self):
+        self._pending: Dict[Tuple[Any, int], Tuple[str, Any, Any]] = {}
+        self.slow_count = 0
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        name = event.command_name
+        field = self.FILTER_FIELDS.get(name)
+        if field is None:
+            return
+        self._pending[(event.connection_id, event.request_id)] = (
+            name, event.command.get(name), event.command.get(field)
+        )
+
+    def _finish(self, event, failed: bool) -> None:
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        duration_ms = event.duration_micros / 1000
+        if pending is None or duration_ms < settings.MONGODB_SLOW_QUERY_MS:
+            return
+
+        name, collection, spec = pending
+        if name in ("update", "delete") and isinstance(spec, list):
+            spec = [op.get("q") for op in spec[:1]]
+        self.slow_count += 1
+        status = "failed" if failed else "ok"
+        logger.warning(f"Slow MongoDB {name} on {collection}: {duration_ms:.1f}ms ({status}) shape={query_shape(spec)}")
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finish(event, failed=False)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finish(event, failed=True)
+
+class LoopLagMonitor:
+    """
+    Event-loop lag monitor with stack capture of the blocking code
+
+    A coroutine updates a heartbeat every PROFILING_LOOP_LAG_INTERVAL seconds
+    and a watchdog thread checks it. When the heartbeat is older than
+    PROFILING_LOOP_LAG_THRESHOLD_MS the loop is blocked, and the watchdog logs
+    the stack the loop thread is executing at that moment.
+    """
+
+    _heartbeat: float = 0.0
+    _loop_thread_id: Optional[int] = None
+    _max_lag_ms: float = 0.0
+    _stalls: int = 0
+
+    @classmethod
+    async def run(cls) -> None:
+        cls._loop_thread_id = threading.get_ident()
+        cls._heartbeat = time.monotonic()
+        threading.Thread(target=cls._watchdog, name="loop-lag-watchdog", daemon=True).start()
+
+        interval = settings.PROFILING_LOOP_LAG_INTERVAL
+        while True:
+            expected = time.monotonic() + interval
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            cls._max_lag_ms = max(cls._max_lag_ms, (now - expected) * 1000)
+            cls._heartbeat = now
+
+    @classmethod
+    def _watchdog(cls) -> None:
+        threshold = settings.PROFILING_LOOP_LAG_THRESHOLD_MS / 1000
+        interval = settings.PROFILING_LOOP_LAG_INTERVAL
+        reported = None
+        while True:
+            time.sleep(interval)
+            heartbeat = cls._heartbeat
+            stalled = time.monotonic() - heartbeat - interval
+            # Un informe por bloqueo: se espera a que el heartbeat avance de nuevo
+            if stalled < threshold or reported == heartbeat:
+                continue
+
+            reported = heartbeat
+            cls._stalls += 1
+            frame = sys._current_frames().get(cls._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "<unavailable>"
+            logger.warning(f"Event loop blocked for {stalled * 1000:.0f}ms+, loop thread stack:\n{stack}")
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, float]:
+        return {"max_lag_ms": round(cls._max_lag_ms, 2), "stalls": cls._stalls}
+
+class StackSampler:
+    """On-demand sampling profiler of the event-loop thread"""
+
+    _lock = threading.Lock()
+
+    @classmethod
+    async def profile(cls, seconds: float, interval: float = 0.005, top: int = 200) -> List[str]:
+        """
+        Sample the loop thread's stack and return collapsed stacks
+
+        Args:
+            seconds: Sampling duration
+            interval: Seconds between samples
+            top: Number of distinct stacks returned
+
+        Returns:
+            List[str]: "frame;frame;frame count" lines, most frequent first, ready
+                for flamegraph.pl or speedscope
+        """
+        if not cls._lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+
+        loop_thread_id = threading.get_ident()
+        samples: Counter = Counter()
+        done = threading.Event()
+
+        def sample():
+            while not done.wait(interval):
+                frame = sys._current_frames().get(loop_thread_id)
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                    frame = frame.f_back
+                samples[";".join(reversed(frames))] += 1
+
+        thread = threading.Thread(target=sample, name="stack-sampler", daemon=True)
+        try:
+            thread.start()
+            await asyncio.sleep(seconds)
+        finally:
+            done.set()
+            thread.join()
+            cls._lock.release()
+
+        return [f"{stack} {count}" for stack, count in samples.most_common(top)]
@@ -4,9 +4,15 @@ from datetime import datetime
 from loguru import logger
 
 from .config import settings
+from ..services.job_service import JobService
+from ..services.rescoring_service import RescoringService
+from ..services.retention_service import RetentionService
 from ..services.scraper_service import ScraperService
 from ..validators.proxy_validator import ProxyValidator
 
+# Igual que el valor por defecto de /validate/all, para que ambos se unan al mismo job
+VALIDATION_BATCH_SIZE = 10
+
 class Scheduler:
     """Task scheduler for periodic jobs"""
     
@@ -14,19 +20,54 @@ class Scheduler:
     async def scrape_job():
         """Periodic job to scrape proxies"""
         logger.info("Starting scheduled scraping job")
-        await ScraperService.scrape_all()
+        # Se comparte con un scraping lanzado desde la API si ya está en curso
+        await JobService.run("scrape_all", lambda progress: ScraperService.scrape_all(progress=progress))
     
     @staticmethod
     async def validate_job():
         """Periodic job to validate proxies"""
         logger.info("Starting scheduled validation job")
-        await ProxyValidator.validate_all()
+        await JobService.run(
+            "validate_all",
+            lambda progress: ProxyValidator.validate_all(batch_size=VALIDATION_BATCH_SIZE, progress=progress),
+            params={"batch_size": VALIDATION_BATCH_SIZE}
+        )
+    
+    @staticmethod
+    async def retention_job():
+        """Periodic job applying the scheduled retention policies after validation"""
+        logger.info("Starting scheduled retention job")
+        # Como job, nunca se solapa con una ejecución lanzada desde /retention/run
+        await JobService.run(
+            "retention",
+            lambda progress: RetentionService.run(progress=progress, scheduled_only=True),
+            params={"scheduled_only": True}
+        )
+    
+    @staticmethod
+    async def rescore_job():
+        """Periodic job to rescore the whole pool with time decay"""
+        logger.info("Starting scheduled rescoring job")
+        await JobService.run("rescore", lambda progress: RescoringService.rescore_all(progress=progress))
+    
+    @classmethod
+    async def rescore_loop(cls):
+        """Run the rescoring job every RESCORE_INTERVAL seconds"""
+        while True:
+            await asyncio.sleep(settings.RESCORE_INTERVAL)
+            try:
+                await cls.rescore_job()
+            except Exception as e:
+                logger.error(f"Error in rescoring scheduler: {e}")
     
     @classmethod
     async def start(cls):
         """Start the scheduler"""
         logger.info("Starting scheduler")
         
+        # Rescoring runs on its own, shorter cycle
+        asyncio.create_task(cls.rescore_loop())
+        
         while True:
             try:
                 # Run scraping job
@@ -35,6 +76,9 @@ class Scheduler:
                 # Run validation job
                 await cls.validate_job()
                 
+                # Remove the proxies the validation left dead
+                await cls.retention_job()
+                
                 # Sleep until next run
                 logger.info(f"Sleeping for {settings.SCRAPING_INTERVAL} seconds until next job")
                 await asyncio.sleep(settings.SCRAPING_INTERVAL)
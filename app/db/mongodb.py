@@ -1,12 +1,51 @@
 import motor.motor_asyncio
+from pymongo.errors import CollectionInvalid, OperationFailure
 from loguru import logger
 from ..core.config import settings
+from ..core.profiling import SlowCommandListener
 
-client = motor.motor_asyncio.AsyncIOMotorClient(settings.MONGODB_URL)
+# Log de operaciones lentas; sin profiling no se registra ningún listener
+slow_command_listener = SlowCommandListener() if settings.PROFILING_ENABLED else None
+
+client = motor.motor_asyncio.AsyncIOMotorClient(
+    settings.MONGODB_URL,
+    serverSelectionTimeoutMS=settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+    event_listeners=[slow_command_listener] if slow_command_listener else []
+)
 db = client[settings.MONGODB_DB]
 
 # Collections
 proxy_collection = db.proxies
+scraper_state_collection = db.scraper_state
+dead_proxy_filter_collection = db.dead_proxy_filter
+proxy_events_collection = db.proxy_events
+proxy_archive_collection = db.proxy_archive
+counters_collection = db.counters
+proxy_tombstones_collection = db.proxy_tombstones
+
+async def create_events_collection():
+    """Create the append-only validation/usage events collection with TTL retention"""
+    try:
+        # Colección time-series (MongoDB 5.0+) con caducidad automática
+        await db.create_collection(
+            "proxy_events",
+            timeseries={"timeField": "timestamp", "metaField": "proxy", "granularity": "minutes"},
+            expireAfterSeconds=settings.PROXY_HISTORY_RETENTION
+        )
+        logger.info("Created proxy_events time-series collection")
+    except CollectionInvalid:
+        # Ya existe
+        pass
+    except OperationFailure as e:
+        # Servidores sin time-series: colección normal con índice TTL
+        logger.warning(f"Time-series collections not available, using a TTL index instead: {e}")
+        await proxy_events_collection.create_index(
+            [("timestamp", 1)],
+            expireAfterSeconds=settings.PROXY_HISTORY_RETENTION
+        )
+    
+    # Create index on (ip, port, time) for history queries
+    await proxy_events_collection.create_index([("proxy.ip", 1), ("proxy.port", 1), ("timestamp", 1)])
 
 async def create_indexes():
     """Create indexes for better performance"""
@@ -20,9 +59,33 @@ async def create_indexes():
         # Create index on score for sorting
         await proxy_collection.create_index([("score", -1)])
         
+        # Create multikey index on supported protocols for protocol filtering sorted by score
+        await proxy_collection.create_index([("protocols.protocol", 1), ("protocols.status", 1), ("score", -1)])
+        try:
+            # Sustituido por el índice anterior, que también cubre la ordenación
+            await proxy_collection.drop_index("protocols.protocol_1_protocols.status_1")
+        except OperationFailure:
+            pass
+        
         # Create index on last_checked for maintenance
         await proxy_collection.create_index([("last_checked", 1)])
         
+        # Create compound indexes for geo filtering sorted by score
+        await proxy_collection.create_index([("country", 1), ("status", 1), ("score", -1)])
+        await proxy_collection.create_index([("asn", 1), ("status", 1), ("score", -1)])
+        
+        # Create indexes on the update sequence for delta sync
+        await proxy_collection.create_index([("update_seq", 1)])
+        await proxy_tombstones_collection.create_index([("seq", 1)])
+        
+        await create_events_collection()
+        
+        # Create TTL index on the retention archive
+        await proxy_archive_collection.create_index(
+            [("deleted_at", 1)],
+            expireAfterSeconds=settings.RETENTION_ARCHIVE_TTL
+        )
+        
         logger.info("MongoDB indexes created successfully")
     except Exception as e:
         logger.error(f"Error creating MongoDB indexes: {e}")
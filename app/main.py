@@ -7,7 +7,17 @@ import asyncio
 from app.api.endpoints import router as api_router
 from app.db.mongodb import connect_to_mongodb
 from app.core.config import settings
+from app.core.profiling import LoopLagMonitor, ProfilingMiddleware, install_serialization_timing
 from app.core.scheduler import Scheduler
+from app.services.dead_proxy_cache import DeadProxyCache
+from app.services.geo_service import GeoService
+from app.services.history_service import HistoryService
+from app.services.job_service import JobService
+from app.services.rescoring_service import RescoringService
+from app.services.retention_service import RetentionService
+from app.services.snapshot_service import SnapshotService
+from app.services.stats_service import StatsService
+from app.services.sync_service import SequenceOwnershipError, SyncService
 
 # Configure loguru
 logger.add(
@@ -36,21 +46,103 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Profiling is opt-in; when disabled nothing is installed
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+    install_serialization_timing()
+
 # Add routers
 app.include_router(api_router, prefix="/api", tags=["proxies"])
 
+async def initialize_database():
+    """Connect to MongoDB and load the state kept there"""
+    await connect_to_mongodb()
+    await DeadProxyCache.load()
+    await RetentionService.drop_ttl_indexes()
+    await SyncService.init()
+
+async def reconnect_database():
+    """Retry the MongoDB connection while serving from the snapshot"""
+    while True:
+        await asyncio.sleep(settings.MONGODB_RECONNECT_INTERVAL)
+        try:
+            await initialize_database()
+        except Exception as e:
+            logger.warning(f"MongoDB still unavailable: {e}")
+            continue
+        
+        SnapshotService.set_degraded(False)
+        start_background_tasks()
+        return
+
+def start_background_tasks():
+    """Start the periodic jobs that need MongoDB"""
+    # Start scheduler in background
+    asyncio.create_task(Scheduler.start())
+    
+    # Start proxy events writer in background
+    asyncio.create_task(HistoryService.run_flusher())
+    
+    # Keep pool stats reconciled in background
+    asyncio.create_task(StatsService.run_reconciler())
+    
+    # Score references for reports, computed once before the first rescoring run
+    asyncio.create_task(RescoringService.warm_references())
+    
+    # Refresh the warm-start snapshot in background
+    asyncio.create_task(SnapshotService.run_writer())
+    
+    # Keep the single-writer lease alive
+    asyncio.create_task(SyncService.run_lease_keeper())
+    
+    # Resolve proxies stored before the current geo databases were configured
+    if GeoService.is_enabled():
+        JobService.submit("geo_backfill", lambda progress: GeoService.backfill(progress=progress))
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize services on startup"""
     logger.info("Starting Proxy Service...")
-    await connect_to_mongodb()
     
-    # Start scheduler in background
-    asyncio.create_task(Scheduler.start())
+    if settings.PROFILING_ENABLED:
+        asyncio.create_task(LoopLagMonitor.run())
+    
+    # El snapshot se mapea en milisegundos y permite servir antes de tener MongoDB
+    SnapshotService.load()
+    
+    # Las bases geo pueden tener millones de rangos: se cargan fuera del event loop
+    if settings.GEO_DB_PATHS:
+        await asyncio.get_running_loop().run_in_executor(None, GeoService.load)
+    
+    try:
+        await initialize_database()
+    except SequenceOwnershipError:
+        # Otro worker sirve ya esta base de datos: no se arranca en modo degradado
+        raise
+    except Exception as e:
+        if not SnapshotService.is_loaded():
+            raise
+        logger.error(f"MongoDB unavailable, serving from pool snapshot: {e}")
+        SnapshotService.set_degraded(True)
+        asyncio.create_task(reconnect_database())
+        return
+    
+    start_background_tasks()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush pending work on shutdown"""
+    await HistoryService.flush()
+    try:
+        await SyncService.release_lease()
+    except Exception as e:
+        logger.warning(f"Could not release the writer lease: {e}")
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
+    if SnapshotService.is_degraded():
+        return {"status": "degraded"}
     return {"status": "healthy"}
 
 if __name__ == "__main__":
@@ -0,0 +1,42 @@
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, Optional
+from pydantic import BaseModel, Field
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class Job(BaseModel):
+    id: str
+    kind: str
+    params: Dict[str, Any] = {}  # Parámetros con los que se lanzó el job
+    coalesced: bool = False  # Solo en la respuesta: la petición se unió a un job ya activo
+    requested_params: Optional[Dict[str, Any]] = None  # Solo si el job activo usa otros parámetros
+    status: JobStatus = JobStatus.QUEUED
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    processed: int = 0
+    total: Optional[int] = None
+    throughput: Optional[float] = None  # Elementos por segundo
+    eta_seconds: Optional[float] = None
+    result: Any = None
+    error: Optional[str] = None
+    
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "id": "5f0c6c1e9b1d4c8f8a3c2e7d1b0a9f4e",
+                "kind": "validate_all",
+                "params": {"batch_size": 10},
+                "status": "running",
+                "processed": 1200,
+                "total": 4800,
+                "throughput": 40.0,
+                "eta_seconds": 90.0
+            }
+        }
+    }
@@ -15,19 +15,57 @@ class ProxyStatus(str, Enum):
     BLOCKED = "blocked"
     UNKNOWN = "unknown"
 
+class ProxyDiversity(str, Enum):
+    SUBNET = "subnet"  # /24 en IPv4, /48 en IPv6
+    ASN = "asn"  # Sistema autónomo; si no se conoce, la subred
+
+class ProxyEventKind(str, Enum):
+    VALIDATION = "validation"
+    USAGE = "usage"
+
 class ProxyValidationResult(BaseModel):
     timestamp: datetime = Field(default_factory=datetime.utcnow)
+    kind: ProxyEventKind = ProxyEventKind.USAGE
+    success: bool
+    latency_ms: Optional[int] = None
+    error: Optional[str] = None
+    blocked_by_google: bool = False
+
+class ProxyReport(BaseModel):
+    """Usage result reported by a client"""
+    ip: str
+    port: int
     success: bool
     latency_ms: Optional[int] = None
     error: Optional[str] = None
     blocked_by_google: bool = False
 
+class ProxyHistoryBucket(BaseModel):
+    """Downsampled validation/usage history over a fixed time bucket"""
+    timestamp: datetime
+    count: int
+    success_count: int
+    success_rate: float
+    avg_latency_ms: Optional[float] = None
+    max_latency_ms: Optional[int] = None
+
+class ProxyProtocolStatus(BaseModel):
+    """Validation state of one protocol supported by a proxy"""
+    protocol: ProxyProtocol
+    status: ProxyStatus = ProxyStatus.UNKNOWN
+    latency_ms: Optional[int] = None
+    error: Optional[str] = None
+    last_checked: Optional[datetime] = None
+
 class Proxy(BaseModel):
     ip: str
     port: int
-    protocol: ProxyProtocol = ProxyProtocol.HTTP
-    country: Optional[str] = None
+    protocol: ProxyProtocol = ProxyProtocol.HTTP  # Protocolo principal (el más rápido que funciona)
+    protocols: List[ProxyProtocolStatus] = []
+    country: Optional[str] = None  # Código ISO de dos letras cuando hay base de datos geo
     city: Optional[str] = None
+    asn: Optional[int] = None
+    as_org: Optional[str] = None
     anonymity: Optional[str] = None
     status: ProxyStatus = ProxyStatus.UNKNOWN
     score: int = 0  # 0-100
@@ -36,7 +74,8 @@ class Proxy(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     success_count: int = 0
     fail_count: int = 0
-    validation_history: List[ProxyValidationResult] = []
+    avg_latency_ms: Optional[int] = None  # Media móvil exponencial de latencias con éxito
+    validation_history: List[ProxyValidationResult] = []  # Solo en respuestas; se guarda en proxy_events
     source: str = "manual"
     metadata: Dict = {}
     
@@ -46,7 +85,13 @@ class Proxy(BaseModel):
                 "ip": "192.168.1.1",
                 "port": 8080,
                 "protocol": "http",
-                "country": "Spain",
+                "protocols": [
+                    {"protocol": "http", "status": "active", "latency_ms": 420},
+                    {"protocol": "socks5", "status": "inactive"}
+                ],
+                "country": "ES",
+                "asn": 3352,
+                "as_org": "TELEFONICA DE ESPANA",
                 "anonymity": "high",
                 "status": "active",
                 "score": 85
@@ -57,7 +102,27 @@ class Proxy(BaseModel):
     @property
     def url(self) -> str:
         """Get proxy URL in format protocol://ip:port"""
-        return f"{self.protocol}://{self.ip}:{self.port}"
+        return f"{self.protocol.value}://{self.ip}:{self.port}"
+
+    @property
+    def supported_protocols(self) -> List[ProxyProtocol]:
+        """Protocols advertised for this proxy, falling back to the primary one"""
+        if self.protocols:
+            return [p.protocol for p in self.protocols]
+        return [self.protocol]
+
+    @staticmethod
+    def protocol_statuses(protocols) -> List[ProxyProtocolStatus]:
+        """Build unvalidated protocol entries from raw protocol names, skipping unknown ones"""
+        statuses = []
+        for name in protocols:
+            try:
+                protocol = ProxyProtocol(str(name).lower())
+            except ValueError:
+                continue
+            if all(s.protocol != protocol for s in statuses):
+                statuses.append(ProxyProtocolStatus(protocol=protocol))
+        return statuses
     
     @validator('score')
     def score_range(cls, v):
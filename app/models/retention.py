@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field, model_validator
+
+class RetentionPolicy(BaseModel):
+    """Declarative rule selecting proxies to remove from the pool"""
+    name: str
+    filter: Dict = {}
+    age_field: Optional[str] = None  # Campo de fecha que determina la antigüedad
+    max_age_seconds: Optional[int] = None
+    record_dead: bool = True  # Añadir a la caché negativa de proxies muertos
+    archive: Optional[bool] = None  # None: usar RETENTION_ARCHIVE_ENABLED
+    scheduled: bool = True  # Aplicar tras cada ciclo de validación del scheduler
+    enabled: bool = True
+    
+    @model_validator(mode="after")
+    def check_age(self):
+        if (self.age_field is None) != (self.max_age_seconds is None):
+            raise ValueError("age_field and max_age_seconds must be set together")
+        return self
+    
+    def build_query(self, now: datetime) -> Dict:
+        """MongoDB filter for the proxies this policy removes at a given time"""
+        query = dict(self.filter)
+        if self.age_field:
+            query[self.age_field] = {"$lt": now - timedelta(seconds=self.max_age_seconds)}
+        return query
+
+class RetentionPolicyReport(BaseModel):
+    name: str
+    deleted: int = 0
+    archived: int = 0
+    batches: int = 0
+    duration_ms: int = 0
+
+class RetentionReport(BaseModel):
+    started_at: datetime = Field(default_factory=datetime.utcnow)
+    duration_ms: int = 0
+    deleted: int = 0
+    policies: List[RetentionPolicyReport] = []
@@ -0,0 +1,44 @@
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, validator
+from .proxy import ProxyProtocol, ProxyStatus
+
+class ProxyRemoval(BaseModel):
+    ip: str
+    port: int
+    seq: int
+
+class ProxyChanges(BaseModel):
+    cursor: int  # Pasar como since en la siguiente llamada
+    has_more: bool = False
+    full_resync_required: bool = False  # El cursor es anterior a las bajas conservadas
+    upserted: List[Dict[str, Any]] = []
+    removed: List[ProxyRemoval] = []
+
+class SubscriptionFilter(BaseModel):
+    status: Optional[ProxyStatus] = ProxyStatus.ACTIVE
+    min_score: int = 0
+    protocol: Optional[ProxyProtocol] = None
+    country: Optional[str] = None
+
+    model_config = {"frozen": True}  # Hashable: los suscriptores con el mismo filtro se agrupan
+
+    @validator("country")
+    def normalize_country(cls, v):
+        return v.upper() if v else None
+
+    def matches(self, doc: Dict) -> bool:
+        """Whether a proxy document passes the filter"""
+        if self.status and doc.get("status") != self.status.value:
+            return False
+        if (doc.get("score") or 0) < self.min_score:
+            return False
+        if self.country and (doc.get("country") or "").upper() != self.country:
+            return False
+        if self.protocol:
+            protocols = [
+                p.get("protocol") for p in doc.get("protocols") or []
+                if p.get("status") != ProxyStatus.INACTIVE.value
+            ] or [doc.get("protocol")]
+            if self.protocol.value not in protocols:
+                return False
+        return True
@@ -19,6 +19,15 @@ class BaseScraper(ABC):
         """
         pass
     
+    async def commit_state(self) -> None:
+        """
+        Persist incremental scraping state once the scraped proxies are stored
+        
+        Called by ScraperService only after every proxy returned by scrape()
+        was added (or skipped on purpose); scrapers without state do nothing.
+        """
+        pass
+    
     async def make_request(self, url: str, headers=None, **kwargs) -> httpx.Response:
         """
         Make an HTTP request with error handling
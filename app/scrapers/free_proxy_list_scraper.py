@@ -1,64 +1,133 @@
-from typing import List
-from bs4 import BeautifulSoup
+import asyncio
+from typing import List, Optional, Tuple
+from lxml import html as lxml_html
+from pydantic import TypeAdapter, ValidationError
 from loguru import logger
 from .base_scraper import BaseScraper
 from ..models.proxy import Proxy, ProxyProtocol, ProxyStatus
 
+# (ip, port, country, anonymity, https)
+ProxyRow = Tuple[str, int, str, str, bool]
+
+_proxy_list_adapter = TypeAdapter(List[Proxy])
+
 class FreeProxyListScraper(BaseScraper):
     """Scraper for free-proxy-list.net"""
-    
+
     name = "free_proxy_list"
     url = "https://free-proxy-list.net/"
-    
+
+    # XPath de las filas de la tabla de proxies
+    rows_xpath = "//table[@id='proxylisttable']/tbody/tr"
+
     async def scrape(self) -> List[Proxy]:
         """Scrape proxies from free-proxy-list.net"""
-        proxies = []
-        
         try:
             response = await self.make_request(self.url)
-            soup = BeautifulSoup(response.text, 'lxml')
-            
-            # Find the table with proxies
-            table = soup.find('table', {'id': 'proxylisttable'})
-            if not table:
-                logger.warning(f"No proxy table found on {self.url}")
-                return []
-            
-            # Extract proxies from table rows
-            tbody = table.find('tbody')
-            rows = tbody.find_all('tr')
-            
-            for row in rows:
-                cells = row.find_all('td')
-                if len(cells) >= 8:
-                    try:
-                        ip = cells[0].text.strip()
-                        port = int(cells[1].text.strip())
-                        country = cells[2].text.strip()
-                        anonymity = cells[4].text.strip().lower()
-                        https = cells[6].text.strip().lower() == 'yes'
-                        
-                        protocol = ProxyProtocol.HTTPS if https else ProxyProtocol.HTTP
-                        
-                        proxy = Proxy(
-                            ip=ip,
-                            port=port,
-                            protocol=protocol,
-                            country=country,
-                            anonymity=anonymity,
-                            status=ProxyStatus.UNKNOWN,
-                            score=50,  # Default score until validated
-                            source=self.name
-                        )
-                        
-                        proxies.append(proxy)
-                    except Exception as e:
-                        logger.warning(f"Error parsing proxy row: {e}")
-                        continue
-            
+
+            # El parsing es CPU puro: se ejecuta fuera del event loop
+            loop = asyncio.get_running_loop()
+            proxies = await loop.run_in_executor(None, self.parse_html, response.text)
+
             self.log_result(proxies)
             return proxies
-        
+
         except Exception as e:
             logger.error(f"Error scraping {self.name}: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    @classmethod
+    def parse_html(cls, text: str) -> List[Proxy]:
+        """
+        Parse the proxy table of a free-proxy-list.net page
+
+        Args:
+            text: Raw HTML of the page
+
+        Returns:
+            List[Proxy]: List of proxy objects
+        """
+        rows = cls.extract_rows(text)
+        if rows is None:
+            logger.warning(f"No proxy table found on {cls.url}")
+            return []
+
+        return cls.rows_to_proxies(rows)
+
+    @classmethod
+    def extract_rows(cls, text: str) -> Optional[List[ProxyRow]]:
+        """
+        Extract the proxy table as lightweight row tuples using lxml XPath
+
+        Args:
+            text: Raw HTML of the page
+
+        Returns:
+            Optional[List[ProxyRow]]: Parsed rows, or None if the table is missing
+        """
+        tree = lxml_html.fromstring(text)
+        if not tree.xpath("//table[@id='proxylisttable']"):
+            return None
+
+        rows = []
+        for tr in tree.xpath(cls.rows_xpath):
+            cells = [td.text_content().strip() for td in tr.iterchildren("td")]
+            if len(cells) < 8:
+                continue
+
+            try:
+                port = int(cells[1])
+            except ValueError:
+                logger.warning(f"Error parsing proxy row: invalid port {cells[1]!r}")
+                continue
+
+            rows.append((
+                cells[0],
+                port,
+                cells[2],
+                cells[4].lower(),
+                cells[6].lower() == "yes"
+            ))
+
+        return rows
+
+    @classmethod
+    def rows_to_proxies(cls, rows: List[ProxyRow]) -> List[Proxy]:
+        """
+        Convert row tuples into Proxy objects with a single bulk validation
+
+        Args:
+            rows: Rows returned by extract_rows
+
+        Returns:
+            List[Proxy]: List of proxy objects
+        """
+        items = [
+            {
+                "ip": ip,
+                "port": port,
+                "protocol": ProxyProtocol.HTTPS if https else ProxyProtocol.HTTP,
+                "protocols": [
+                    {"protocol": protocol}
+                    for protocol in ((ProxyProtocol.HTTP, ProxyProtocol.HTTPS) if https else (ProxyProtocol.HTTP,))
+                ],
+                "country": country,
+                "anonymity": anonymity,
+                "status": ProxyStatus.UNKNOWN,
+                "score": 50,  # Default score until validated
+                "source": cls.name
+            }
+            for ip, port, country, anonymity, https in rows
+        ]
+
+        try:
+            return _proxy_list_adapter.validate_python(items)
+        except ValidationError:
+            # Alguna fila es inválida: validar una a una para descartar solo esas
+            proxies = []
+            for item in items:
+                try:
+                    proxies.append(Proxy(**item))
+                except Exception as e:
+                    logger.warning(f"Error parsing proxy row: {e}")
+            return proxies
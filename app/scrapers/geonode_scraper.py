@@ -1,98 +1,190 @@
-from typing import List
-import json
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
 import asyncio
 from loguru import logger
 from .base_scraper import BaseScraper
+from ..core.config import settings
+from ..db.mongodb import scraper_state_collection
 from ..models.proxy import Proxy, ProxyProtocol, ProxyStatus
 
 class GeonodeScraper(BaseScraper):
     """Scraper for geonode.com free proxy API"""
-    
+
     name = "geonode"
     base_url = "https://proxylist.geonode.com/api/proxy-list?limit=50&sort_by=lastChecked&sort_type=desc"
-    
+
+    async def load_state(self) -> Dict:
+        """Load the persisted high-water mark and last full resync time"""
+        state = await scraper_state_collection.find_one({"_id": self.name})
+        return state or {}
+
+    def __init__(self):
+        # Marca de la última ejecución completa, pendiente de que se guarden sus proxies
+        self._pending_state: Optional[Tuple[Optional[datetime], bool]] = None
+
+    async def commit_state(self) -> None:
+        """Persist the high-water mark of the last scrape() once its proxies are stored"""
+        if self._pending_state is None:
+            return
+        await self.save_state(*self._pending_state)
+        self._pending_state = None
+
+    async def save_state(self, high_water_mark: Optional[datetime], full_sync: bool) -> None:
+        """Persist the high-water mark (and the full resync time if this run was one)"""
+        update = {"high_water_mark": high_water_mark}
+        if full_sync:
+            update["last_full_sync"] = datetime.utcnow()
+
+        await scraper_state_collection.update_one(
+            {"_id": self.name},
+            {"$set": update},
+            upsert=True
+        )
+
+    @staticmethod
+    def parse_last_checked(value) -> Optional[datetime]:
+        """Convert Geonode's lastChecked (unix seconds) into a naive UTC datetime"""
+        if value is None:
+            return None
+        try:
+            return datetime.utcfromtimestamp(int(value))
+        except (TypeError, ValueError, OverflowError):
+            return None
+
+    def parse_item(self, item: Dict) -> Proxy:
+        """Build a Proxy from a Geonode API item"""
+        ip = item.get("ip")
+        port = int(item.get("port"))
+        country = item.get("country")
+        city = item.get("city", None)
+        protocols = item.get("protocols", [])
+        anonymity = item.get("anonymityLevel", "").lower()
+
+        # Use the first supported protocol, defaulting to HTTP
+        protocol = ProxyProtocol.HTTP
+        if "socks5" in protocols:
+            protocol = ProxyProtocol.SOCKS5
+        elif "socks4" in protocols:
+            protocol = ProxyProtocol.SOCKS4
+        elif "https" in protocols:
+            protocol = ProxyProtocol.HTTPS
+
+        return Proxy(
+            ip=ip,
+            port=port,
+            protocol=protocol,
+            country=country,
+            city=city,
+            anonymity=anonymity,
+            status=ProxyStatus.UNKNOWN,
+            score=50,  # Default score until validated
+            protocols=Proxy.protocol_statuses(protocols),
+            source=self.name,
+            metadata={
+                "source_last_checked": self.parse_last_checked(item.get("lastChecked")),
+                "uptime": item.get("upTime"),
+                "response_time_ms": item.get("responseTime")
+            }
+        )
+
     async def scrape(self) -> List[Proxy]:
-        """Scrape proxies from geonode.com API with pagination"""
+        """
+        Scrape proxies from geonode.com API with pagination
+
+        Results are sorted by lastChecked descending, so pagination stops as soon
+        as an item older than the stored high-water mark shows up. A full walk of
+        every page is forced every GEONODE_FULL_RESYNC_INTERVAL seconds. The new
+        high-water mark is only persisted by commit_state().
+        """
         all_proxies = []
         current_page = 1
         total_pages = 1  # Inicialmente desconocido, lo actualizaremos con la primera respuesta
-        
+
+        try:
+            state = await self.load_state()
+        except Exception as e:
+            logger.warning(f"Could not load {self.name} scraper state, doing a full resync: {e}")
+            state = {}
+
+        high_water_mark = state.get("high_water_mark")
+        last_full_sync = state.get("last_full_sync")
+        resync_due = datetime.utcnow() - timedelta(seconds=settings.GEONODE_FULL_RESYNC_INTERVAL)
+        full_sync = high_water_mark is None or last_full_sync is None or last_full_sync < resync_due
+
+        if full_sync:
+            logger.info("Running full Geonode resync")
+        else:
+            logger.info(f"Running incremental Geonode scrape since {high_water_mark.isoformat()}")
+
+        newest_seen = high_water_mark
+        reached_seen_data = False
+
         try:
             while current_page <= total_pages:
                 # Construir URL para la página actual
                 url = f"{self.base_url}&page={current_page}"
                 logger.info(f"Scraping Geonode page {current_page}/{total_pages}")
-                
+
                 response = await self.make_request(url)
                 data = response.json()
-                
+
                 if "data" not in data:
                     logger.warning(f"Unexpected response format from {url}")
                     break
-                
+
                 # Extraer información de paginación
                 if current_page == 1 and "total" in data and "limit" in data:
                     total_items = data.get("total", 0)
                     items_per_page = data.get("limit", 50)
                     total_pages = (total_items + items_per_page - 1) // items_per_page
                     logger.info(f"Found {total_items} proxies in {total_pages} pages")
-                
+
                 proxy_data = data["data"]
                 page_proxies = []
-                
+
                 for item in proxy_data:
+                    checked_at = self.parse_last_checked(item.get("lastChecked"))
+
+                    # Datos ya vistos en una ejecución anterior: el resto de páginas son más antiguas
+                    if not full_sync and checked_at is not None and checked_at < high_water_mark:
+                        reached_seen_data = True
+                        break
+
+                    if checked_at is not None and (newest_seen is None or checked_at > newest_seen):
+                        newest_seen = checked_at
+
                     try:
-                        ip = item.get("ip")
-                        port = int(item.get("port"))
-                        country = item.get("country")
-                        city = item.get("city", None)
-                        protocols = item.get("protocols", [])
-                        anonymity = item.get("anonymityLevel", "").lower()
-                        
-                        # Use the first supported protocol, defaulting to HTTP
-                        protocol = ProxyProtocol.HTTP
-                        if "socks5" in protocols:
-                            protocol = ProxyProtocol.SOCKS5
-                        elif "socks4" in protocols:
-                            protocol = ProxyProtocol.SOCKS4
-                        elif "https" in protocols:
-                            protocol = ProxyProtocol.HTTPS
-                        
-                        proxy = Proxy(
-                            ip=ip,
-                            port=port,
-                            protocol=protocol,
-                            country=country,
-                            city=city,
-                            anonymity=anonymity,
-                            status=ProxyStatus.UNKNOWN,
-                            score=50,  # Default score until validated
-                            source=self.name
-                        )
-                        
-                        page_proxies.append(proxy)
+                        page_proxies.append(self.parse_item(item))
                     except Exception as e:
                         logger.warning(f"Error parsing proxy item: {e}")
                         continue
-                
+
                 logger.info(f"Scraped {len(page_proxies)} proxies from page {current_page}")
                 all_proxies.extend(page_proxies)
-                
+
+                if reached_seen_data:
+                    logger.info(f"Reached already-seen Geonode data on page {current_page}, stopping")
+                    break
+
                 # Si no hay más datos o llegamos a una página vacía, salimos del bucle
                 if not proxy_data:
                     logger.info(f"No more data on page {current_page}, stopping")
                     break
-                
+
                 # Pasar a la siguiente página
                 current_page += 1
-                
+
                 # Para evitar sobrecarga de solicitudes, añadimos un pequeño retraso
                 await asyncio.sleep(1)
-            
+
+            # Solo se avanza la marca si la ejecución terminó sin errores, y no antes de
+            # guardar los proxies: ScraperService llama a commit_state() tras ingerirlos
+            self._pending_state = (newest_seen, full_sync)
+
             logger.info(f"Total proxies scraped from Geonode: {len(all_proxies)}")
             self.log_result(all_proxies)
             return all_proxies
-        
+
         except Exception as e:
             logger.error(f"Error scraping {self.name}: {e}")
-            return all_proxies  # Devolver los proxies que hayamos conseguido hasta el error
\ No newline at end of file
+            return all_proxies  # Devolver los proxies que hayamos conseguido hasta el error
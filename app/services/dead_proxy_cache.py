@@ -0,0 +1,170 @@
+import time
+from typing import Dict, Iterable, Tuple
+from bson.binary import Binary
+from loguru import logger
+
+from ..core.bloom_filter import BloomFilter
+from ..core.config import settings
+from ..db.mongodb import dead_proxy_filter_collection
+
+class DeadProxyCache:
+    """
+    Persistent negative cache of recently deleted ip:port pairs
+
+    Entries live in a ring of time-sliced Bloom filters ("generations"). New
+    entries go to the current generation and lookups check every live one, so
+    an entry expires between DEAD_PROXY_CACHE_EXPIRY·(1 - 1/generations) and
+    DEAD_PROXY_CACHE_EXPIRY seconds after it was added. Each generation is
+    sized for 1/generations of DEAD_PROXY_CACHE_FALSE_POSITIVE_RATE, so the
+    rate of a lookup across all of them stays within the target.
+    """
+
+    _generations: Dict[int, BloomFilter] = {}
+    _dirty: set = set()
+    _metrics: Dict[str, int] = {
+        "checks": 0,
+        "hits": 0,
+        "added": 0
+    }
+
+    @staticmethod
+    def _key(ip: str, port: int) -> str:
+        return f"{ip}:{port}"
+
+    @staticmethod
+    def _generation_span() -> float:
+        return settings.DEAD_PROXY_CACHE_EXPIRY / settings.DEAD_PROXY_CACHE_GENERATIONS
+
+    @classmethod
+    def _current_generation(cls) -> int:
+        return int(time.time() // cls._generation_span())
+
+    @staticmethod
+    def _new_filter(bits=None, count: int = 0) -> BloomFilter:
+        # Una consulta recorre todas las generaciones: sus falsos positivos se suman
+        return BloomFilter(
+            capacity=settings.DEAD_PROXY_CACHE_CAPACITY,
+            false_positive_rate=settings.DEAD_PROXY_CACHE_FALSE_POSITIVE_RATE / settings.DEAD_PROXY_CACHE_GENERATIONS,
+            bits=bits,
+            count=count
+        )
+
+    @classmethod
+    def _expire(cls) -> None:
+        """Drop generations that fell out of the expiry window"""
+        oldest_live = cls._current_generation() - settings.DEAD_PROXY_CACHE_GENERATIONS + 1
+        for generation in [g for g in cls._generations if g < oldest_live]:
+            del cls._generations[generation]
+            cls._dirty.discard(generation)
+
+    @classmethod
+    def contains(cls, ip: str, port: int) -> bool:
+        """
+        Check whether a proxy was recently deleted as dead
+
+        Args:
+            ip: Proxy IP address
+            port: Proxy port
+
+        Returns:
+            bool: True if the proxy is (probably) in the negative cache
+        """
+        if not settings.DEAD_PROXY_CACHE_ENABLED:
+            return False
+
+        cls._expire()
+        cls._metrics["checks"] += 1
+
+        key = cls._key(ip, port)
+        if any(key in bloom for bloom in cls._generations.values()):
+            cls._metrics["hits"] += 1
+            return True
+        return False
+
+    @classmethod
+    def add_many(cls, endpoints: Iterable[Tuple[str, int]]) -> int:
+        """
+        Add dead proxies to the current generation
+
+        Args:
+            endpoints: (ip, port) pairs
+
+        Returns:
+            int: Number of entries added
+        """
+        if not settings.DEAD_PROXY_CACHE_ENABLED:
+            return 0
+
+        cls._expire()
+        generation = cls._current_generation()
+        bloom = cls._generations.get(generation)
+        if bloom is None:
+            bloom = cls._generations[generation] = cls._new_filter()
+
+        added = 0
+        for ip, port in endpoints:
+            bloom.add(cls._key(ip, port))
+            added += 1
+
+        if added:
+            cls._dirty.add(generation)
+            cls._metrics["added"] += added
+            if bloom.count > bloom.capacity:
+                logger.warning(
+                    f"Dead proxy cache generation holds {bloom.count} entries, above its capacity of "
+                    f"{bloom.capacity}; false positive rate will exceed the configured target"
+                )
+        return added
+
+    @classmethod
+    async def load(cls) -> None:
+        """Load live generations from MongoDB"""
+        if not settings.DEAD_PROXY_CACHE_ENABLED:
+            return
+
+        oldest_live = cls._current_generation() - settings.DEAD_PROXY_CACHE_GENERATIONS + 1
+        cls._generations = {}
+        cls._dirty = set()
+
+        try:
+            async for doc in dead_proxy_filter_collection.find({"_id": {"$gte": oldest_live}}):
+                bloom = cls._new_filter(bits=doc.get("bits"), count=doc.get("count", 0))
+                # Si cambió la configuración el filtro guardado no es compatible y empieza vacío
+                cls._generations[doc["_id"]] = bloom
+
+            # Las generaciones caducadas ya no se consultan
+            await dead_proxy_filter_collection.delete_many({"_id": {"$lt": oldest_live}})
+            logger.info(f"Loaded {len(cls._generations)} dead proxy cache generations")
+        except Exception as e:
+            logger.error(f"Error loading dead proxy cache: {e}")
+
+    @classmethod
+    async def save(cls) -> None:
+        """Persist generations modified since the last save"""
+        if not cls._dirty:
+            return
+
+        try:
+            for generation in list(cls._dirty):
+                bloom = cls._generations.get(generation)
+                if bloom is None:
+                    continue
+                await dead_proxy_filter_collection.update_one(
+                    {"_id": generation},
+                    {"$set": {"bits": Binary(bloom.to_bytes()), "count": bloom.count}},
+                    upsert=True
+                )
+            cls._dirty.clear()
+        except Exception as e:
+            logger.error(f"Error saving dead proxy cache: {e}")
+
+    @classmethod
+    def get_metrics(cls) -> Dict:
+        """Hit metrics and current size of the negative cache"""
+        checks = cls._metrics["checks"]
+        return {
+            **cls._metrics,
+            "hit_rate": cls._metrics["hits"] / checks if checks else 0.0,
+            "generations": len(cls._generations),
+            "entries": sum(bloom.count for bloom in cls._generations.values())
+        }
@@ -0,0 +1,276 @@
+import csv
+import ipaddress
+import socket
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from pymongo import UpdateOne
+from loguru import logger
+
+from ..core.config import settings
+from ..core.ip_range_index import IpInfo, IpRange, IpRangeIndex
+from ..db.mongodb import proxy_collection
+from ..models.proxy import Proxy
+from .stats_service import StatsService
+from .subscription_service import SubscriptionService
+from .sync_service import SyncService
+
+# Nombres de columna aceptados en CSV con cabecera
+COLUMNS = {
+    "start": ("start", "ip_start", "range_start", "network_start"),
+    "end": ("end", "ip_end", "range_end", "network_end"),
+    "country": ("country", "country_code", "country_iso_code"),
+    "asn": ("asn", "as_number", "autonomous_system_number"),
+    "org": ("org", "as_org", "as_description", "autonomous_system_organization")
+}
+
+def _parse_ip(value: str) -> int:
+    value = value.strip()
+    return int(value) if value.isdigit() else int(ipaddress.ip_address(value))
+
+def _parse_asn(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    value = value.strip().upper().removeprefix("AS")
+    return int(value) if value.isdigit() and int(value) > 0 else None
+
+def normalize_country(value: Optional[str]) -> Optional[str]:
+    """ISO 3166-1 alpha-2 code in upper case, or None for anything else"""
+    if isinstance(value, str):
+        value = value.strip()
+        if len(value) == 2 and value.isascii() and value.isalpha() and value.upper() not in ("ZZ", "XX"):
+            return value.upper()
+    return None
+
+class GeoService:
+    """
+    Offline country/ASN resolution from local range databases
+
+    GEO_DB_PATHS lists MMDB files (GeoLite2/DB-IP, needs the maxminddb
+    package), iptoasn-style TSV files (start, end, asn, country, description)
+    or CSV files, with a header naming the columns or positional
+    start,end,country. Each file becomes an IpRangeIndex; fields are taken from
+    the first index that knows them. Results are cached per /24 when the
+    matching ranges cover the whole block.
+    """
+
+    _indexes: List[IpRangeIndex] = []
+    _cache: Dict[int, IpInfo] = {}
+
+    @classmethod
+    def load(cls) -> None:
+        """Load every configured database, keeping the previous indexes on errors"""
+        indexes = []
+        for path in settings.GEO_DB_PATHS:
+            start = time.perf_counter()
+            try:
+                index = IpRangeIndex(cls._read(path))
+            except Exception as e:
+                logger.error(f"Error loading geo database {path}: {e}")
+                continue
+            indexes.append(index)
+            logger.info(f"Loaded {len(index)} IP ranges from {path} in {time.perf_counter() - start:.1f}s")
+
+        if indexes or not settings.GEO_DB_PATHS:
+            cls._indexes = indexes
+            cls._cache = {}
+
+    @classmethod
+    def is_enabled(cls) -> bool:
+        return bool(cls._indexes)
+
+    @staticmethod
+    def _read(path: str) -> Iterator[IpRange]:
+        if path.endswith(".mmdb"):
+            import maxminddb  # Dependencia opcional, solo para bases MMDB
+
+            with maxminddb.open_database(path) as reader:
+                for network, record in reader:
+                    record = record or {}
+                    country = (record.get("country") or record.get("registered_country") or {}).get("iso_code")
+                    yield (int(network.network_address), int(network.broadcast_address),
+                           normalize_country(country), record.get("autonomous_system_number"),
+                           record.get("autonomous_system_organization"))
+            return
+
+        with open(path, newline="", encoding="utf-8") as f:
+            delimiter = "\t" if path.endswith(".tsv") else ","
+            reader = csv.reader(f, delimiter=delimiter)
+            first = next(reader, None)
+            if first is None:
+                return
+
+            header = [cell.strip().lower() for cell in first]
+            if any(name in header for name in COLUMNS["start"]):
+                positions = {
+                    field: next((header.index(name) for name in names if name in header), None)
+                    for field, names in COLUMNS.items()
+                }
+                rows = reader
+            else:
+                # Sin cabecera: iptoasn (TSV) o DB-IP lite (CSV)
+                if delimiter == "\t":
+                    positions = {"start": 0, "end": 1, "asn": 2, "country": 3, "org": 4}
+                else:
+                    positions = {"start": 0, "end": 1, "country": 2, "asn": None, "org": None}
+                rows = [first]
+                rows.extend(reader)
+
+            def cell(row, field):
+                i = positions.get(field)
+                return row[i] if i is not None and i < len(row) else None
+
+            for row in rows:
+                if len(row) < 2:
+                    continue
+                asn = _parse_asn(cell(row, "asn"))
+                org = cell(row, "org")
+                yield (_parse_ip(row[positions["start"]]), _parse_ip(row[positions["end"]]),
+                       normalize_country(cell(row, "country")), asn,
+                       org.strip() if asn and org and org.strip() not in ("", "Not routed") else None)
+
+    @classmethod
+    def lookup(cls, ip: str) -> Optional[IpInfo]:
+        """
+        Resolve country, ASN and AS organization of an address
+
+        Returns:
+            Optional[IpInfo]: (country, asn, org), or None if no database knows the address
+        """
+        if not cls._indexes:
+            return None
+
+        try:
+            # inet_pton es bastante más rápido que ipaddress para el caso común IPv4
+            value = int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big")
+        except (OSError, TypeError):
+            return cls._merge(index.lookup(ip) for index in cls._indexes)
+
+        block = value >> 8
+        cached = cls._cache.get(block)
+        if cached is not None:
+            return cached
+
+        infos = []
+        cacheable = True
+        for index in cls._indexes:
+            i = index.find_v4(value)
+            infos.append(index.info_v4(i) if i >= 0 else None)
+            # Solo se cachea si el rango cubre el /24 completo en todas las bases
+            cacheable = cacheable and index.covers_v4(i, block << 8, (block << 8) | 0xFF)
+
+        info = cls._merge(infos)
+        if cacheable and info is not None:
+            if len(cls._cache) >= settings.GEO_CACHE_SIZE:
+                cls._cache.clear()
+            cls._cache[block] = info
+        return info
+
+    @staticmethod
+    def _merge(infos) -> Optional[IpInfo]:
+        country = asn = org = None
+        found = False
+        for info in infos:
+            if info is None:
+                continue
+            found = True
+            country = country or info[0]
+            if asn is None and info[1]:
+                asn, org = info[1], info[2]
+        return (country, asn, org) if found else None
+
+    @classmethod
+    def _resolve(cls, ip: str, claimed: Optional[str]) -> Dict:
+        """Country, and ASN fields when a database is loaded, to store for a proxy"""
+        if not cls._indexes:
+            # Sin bases solo se normaliza lo que dice la fuente; el ASN guardado se mantiene
+            return {"country": normalize_country(claimed)}
+
+        country, asn, org = cls.lookup(ip) or (None, None, None)
+        return {"country": country or normalize_country(claimed), "asn": asn, "as_org": org}
+
+    @classmethod
+    def enrich(cls, proxy: Proxy) -> Proxy:
+        """
+        Replace the country claimed by the source with the resolved one and set the ASN
+
+        Without GEO_DB_PATHS the claimed country is only normalized. The
+        source's claim is kept in metadata["source_country"] when it differs.
+        """
+        claimed = proxy.country
+        for field, value in cls._resolve(proxy.ip, claimed).items():
+            setattr(proxy, field, value)
+        if claimed and claimed != proxy.country:
+            proxy.metadata = {**proxy.metadata, "source_country": claimed}
+        return proxy
+
+    @classmethod
+    async def backfill(cls, progress: Optional[Callable[[int, Optional[int]], None]] = None) -> Dict[str, int]:
+        """
+        Apply enrich() to every stored proxy, writing back the changed ones
+
+        Proxies added before a database was configured or updated get their
+        country and ASN resolved; without GEO_DB_PATHS stored countries are
+        normalized.
+
+        Args:
+            progress: Optional callback receiving (processed, total)
+
+        Returns:
+            Dict with the number of proxies processed and updated
+        """
+        fields = {"_id": 1, "country": 1, "asn": 1, "as_org": 1, "metadata": 1,
+                  **StatsService.FIELDS, **SubscriptionService.FIELDS}
+        total = await proxy_collection.count_documents({})
+        cursor = proxy_collection.find({}, fields, batch_size=settings.GEO_BACKFILL_BATCH_SIZE)
+
+        results = {"processed": 0, "updated": 0}
+        while True:
+            docs = await cursor.to_list(length=settings.GEO_BACKFILL_BATCH_SIZE)
+            if not docs:
+                break
+
+            changes = []
+            for doc in docs:
+                claimed = doc.get("country")
+                update = {
+                    field: value for field, value in cls._resolve(doc["ip"], claimed).items()
+                    if doc.get(field) != value
+                }
+                # Se conserva la primera afirmación de la fuente
+                metadata = doc.get("metadata")
+                country = update.get("country", claimed)
+                if claimed and claimed != country and not (metadata or {}).get("source_country"):
+                    if isinstance(metadata, dict):
+                        update["metadata.source_country"] = claimed
+                    else:
+                        update["metadata"] = {"source_country": claimed}
+                if update:
+                    changes.append((doc, update))
+
+            if changes:
+                await cls._write(changes)
+                results["updated"] += len(changes)
+
+            results["processed"] += len(docs)
+            if progress:
+                progress(results["processed"], total)
+
+        logger.info(f"Geo backfill processed {results['processed']} proxies, updated {results['updated']}")
+        return results
+
+    @staticmethod
+    async def _write(changes: List[Tuple[dict, Dict]]) -> None:
+        """Write (document, $set fields) updates in one bulk operation"""
+        afters = [{**doc, **{k: v for k, v in update.items() if "." not in k}} for doc, update in changes]
+        async with SyncService.sequence(len(changes)) as seqs:
+            await proxy_collection.bulk_write(
+                [
+                    UpdateOne({"_id": doc["_id"]}, {"$set": {**update, "update_seq": seq}})
+                    for (doc, update), seq in zip(changes, seqs)
+                ],
+                ordered=False
+            )
+            for (doc, _), after, seq in zip(changes, afters, seqs):
+                SubscriptionService.publish(doc, after, seq)
+        for (doc, _), after in zip(changes, afters):
+            StatsService.on_change(doc, after)
@@ -0,0 +1,131 @@
+import asyncio
+from datetime import datetime
+from typing import List, Optional, Union
+from loguru import logger
+
+from ..core.config import settings
+from ..db.mongodb import proxy_events_collection
+from ..models.proxy import ProxyHistoryBucket, ProxyValidationResult
+
+class HistoryService:
+    """Buffered writer and query API for the proxy_events time-series collection"""
+
+    _buffer: List[dict] = []
+    _flush_lock: Optional[asyncio.Lock] = None
+
+    @classmethod
+    def _lock(cls) -> asyncio.Lock:
+        if cls._flush_lock is None:
+            cls._flush_lock = asyncio.Lock()
+        return cls._flush_lock
+
+    @classmethod
+    async def record(cls, ip: str, port: int, result: ProxyValidationResult) -> None:
+        """
+        Queue a validation or usage event for a bulk insert
+
+        Args:
+            ip: Proxy IP address
+            port: Proxy port
+            result: Event to record
+        """
+        event = result.dict()
+        event["proxy"] = {"ip": ip, "port": port}
+        cls._buffer.append(event)
+
+        if len(cls._buffer) >= settings.PROXY_HISTORY_BATCH_SIZE:
+            await cls.flush()
+
+    @classmethod
+    async def flush(cls) -> int:
+        """
+        Write all buffered events in a single unordered insert_many
+
+        Returns:
+            int: Number of events written
+        """
+        async with cls._lock():
+            if not cls._buffer:
+                return 0
+
+            events, cls._buffer = cls._buffer, []
+            try:
+                await proxy_events_collection.insert_many(events, ordered=False)
+                logger.debug(f"Flushed {len(events)} proxy events")
+                return len(events)
+            except Exception as e:
+                logger.error(f"Error writing {len(events)} proxy events: {e}")
+                return 0
+
+    @classmethod
+    async def run_flusher(cls) -> None:
+        """Periodically flush the event buffer"""
+        while True:
+            await asyncio.sleep(settings.PROXY_HISTORY_FLUSH_INTERVAL)
+            try:
+                await cls.flush()
+            except Exception as e:
+                logger.error(f"Error in proxy events flusher: {e}")
+
+    @staticmethod
+    async def get_history(
+        ip: str,
+        port: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        bucket_seconds: Optional[int] = None,
+        limit: int = 100
+    ) -> Union[List[ProxyValidationResult], List[ProxyHistoryBucket]]:
+        """
+        Get the events of a proxy in a time range, optionally downsampled
+
+        Args:
+            ip: Proxy IP address
+            port: Proxy port
+            start: Inclusive lower time bound
+            end: Exclusive upper time bound
+            bucket_seconds: Aggregate events into buckets of this size; raw events if None
+            limit: Maximum number of events or buckets returned (most recent first)
+
+        Returns:
+            List of raw events, or list of buckets when bucket_seconds is given
+        """
+        match = {"proxy.ip": ip, "proxy.port": port}
+        time_range = {}
+        if start:
+            time_range["$gte"] = start
+        if end:
+            time_range["$lt"] = end
+        if time_range:
+            match["timestamp"] = time_range
+
+        if not bucket_seconds:
+            cursor = proxy_events_collection.find(match, {"_id": 0, "proxy": 0}).sort("timestamp", -1).limit(limit)
+            return [ProxyValidationResult(**event) for event in await cursor.to_list(length=limit)]
+
+        bucket_ms = bucket_seconds * 1000
+        epoch_ms = {"$toLong": "$timestamp"}
+        pipeline = [
+            {"$match": match},
+            {"$group": {
+                "_id": {"$subtract": [epoch_ms, {"$mod": [epoch_ms, bucket_ms]}]},
+                "count": {"$sum": 1},
+                "success_count": {"$sum": {"$cond": ["$success", 1, 0]}},
+                "avg_latency_ms": {"$avg": {"$cond": ["$success", "$latency_ms", None]}},
+                "max_latency_ms": {"$max": "$latency_ms"}
+            }},
+            {"$sort": {"_id": -1}},
+            {"$limit": limit}
+        ]
+
+        buckets = []
+        async for doc in proxy_events_collection.aggregate(pipeline):
+            buckets.append(ProxyHistoryBucket(
+                timestamp=datetime.utcfromtimestamp(doc["_id"] / 1000),
+                count=doc["count"],
+                success_count=doc["success_count"],
+                success_rate=doc["success_count"] / doc["count"],
+                avg_latency_ms=doc["avg_latency_ms"],
+                max_latency_ms=doc["max_latency_ms"]
+            ))
+        return buckets
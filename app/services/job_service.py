@@ -0,0 +1,144 @@
+import asyncio
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from loguru import logger
+
+from ..core.config import settings
+from ..models.job import Job, JobStatus
+
+# Callback de progreso que recibe cada job: (procesados, total)
+ProgressCallback = Callable[[int, Optional[int]], None]
+
+class JobService:
+    """Bounded in-process executor for long-running operations, coalesced by kind"""
+
+    _jobs: "OrderedDict[str, Job]" = OrderedDict()
+    _tasks: Dict[str, asyncio.Task] = {}
+    _active: Dict[str, str] = {}  # kind -> id del job en cola o en ejecución
+    _semaphore: Optional[asyncio.Semaphore] = None
+
+    @classmethod
+    def _get_semaphore(cls) -> asyncio.Semaphore:
+        if cls._semaphore is None:
+            cls._semaphore = asyncio.Semaphore(settings.JOB_MAX_CONCURRENCY)
+        return cls._semaphore
+
+    @classmethod
+    def submit(
+        cls,
+        kind: str,
+        func: Callable[[ProgressCallback], Awaitable[Any]],
+        params: Optional[Dict[str, Any]] = None
+    ) -> Job:
+        """
+        Enqueue a job, or join the queued/running job of the same kind
+
+        Jobs of one kind never run concurrently, so a request for an active kind
+        is not started even if its parameters differ. The returned copy of the
+        active job then has coalesced set and, when the parameters differ,
+        requested_params with the ones that were not applied.
+
+        Args:
+            kind: Job kind used for coalescing (e.g. "validate_all")
+            func: Coroutine function receiving a progress callback
+            params: Parameters of the job, shown in its status
+
+        Returns:
+            Job: The new job, or a copy of the active one marked as coalesced
+        """
+        params = params or {}
+        active_id = cls._active.get(kind)
+        if active_id is not None:
+            active = cls._jobs[active_id]
+            update = {"coalesced": True}
+            if params != active.params:
+                logger.warning(f"Job {kind} already active as {active_id} with params {active.params}, "
+                               f"ignoring requested params {params}")
+                update["requested_params"] = params
+            else:
+                logger.info(f"Job {kind} already active as {active_id}, coalescing request")
+            return active.model_copy(update=update)
+
+        job = Job(id=uuid.uuid4().hex, kind=kind, params=params)
+        cls._jobs[job.id] = job
+        cls._active[kind] = job.id
+        cls._tasks[job.id] = asyncio.create_task(cls._run(job, func))
+        cls._trim_history()
+
+        logger.info(f"Queued job {kind} ({job.id})")
+        return job
+
+    @classmethod
+    async def run(
+        cls,
+        kind: str,
+        func: Callable[[ProgressCallback], Awaitable[Any]],
+        params: Optional[Dict[str, Any]] = None
+    ) -> Job:
+        """Submit a job (or join the active one of the same kind) and wait for it to finish"""
+        job = cls.submit(kind, func, params)
+        task = cls._tasks.get(job.id)
+        if task is not None:
+            await asyncio.shield(task)
+        return cls._jobs.get(job.id, job)
+
+    @classmethod
+    async def _run(cls, job: Job, func: Callable[[ProgressCallback], Awaitable[Any]]) -> None:
+        async with cls._get_semaphore():
+            job.status = JobStatus.RUNNING
+            job.started_at = datetime.utcnow()
+            logger.info(f"Started job {job.kind} ({job.id})")
+
+            try:
+                job.result = await func(lambda processed, total=None: cls._update_progress(job, processed, total))
+                job.status = JobStatus.COMPLETED
+                job.eta_seconds = 0.0
+            except Exception as e:
+                logger.error(f"Job {job.kind} ({job.id}) failed: {e}")
+                job.status = JobStatus.FAILED
+                job.error = str(e)
+            finally:
+                job.finished_at = datetime.utcnow()
+                cls._update_throughput(job)
+                cls._tasks.pop(job.id, None)
+                if cls._active.get(job.kind) == job.id:
+                    del cls._active[job.kind]
+
+        logger.info(f"Finished job {job.kind} ({job.id}) with status {job.status.value}")
+
+    @classmethod
+    def _update_progress(cls, job: Job, processed: int, total: Optional[int]) -> None:
+        job.processed = processed
+        if total is not None:
+            job.total = total
+        cls._update_throughput(job)
+
+        if job.throughput and job.total is not None:
+            job.eta_seconds = max(0, job.total - job.processed) / job.throughput
+
+    @staticmethod
+    def _update_throughput(job: Job) -> None:
+        if job.started_at is None:
+            return
+        elapsed = ((job.finished_at or datetime.utcnow()) - job.started_at).total_seconds()
+        if elapsed > 0:
+            job.throughput = job.processed / elapsed
+
+    @classmethod
+    def _trim_history(cls) -> None:
+        """Forget the oldest finished jobs beyond JOB_HISTORY_SIZE"""
+        finished = [job_id for job_id, job in cls._jobs.items() if job.finished_at is not None]
+        for job_id in finished[:max(0, len(cls._jobs) - settings.JOB_HISTORY_SIZE)]:
+            del cls._jobs[job_id]
+
+    @classmethod
+    def get(cls, job_id: str) -> Optional[Job]:
+        """Get a job by id"""
+        return cls._jobs.get(job_id)
+
+    @classmethod
+    def list(cls) -> List[Job]:
+        """List known jobs, most recent first"""
+        return list(reversed(cls._jobs.values()))
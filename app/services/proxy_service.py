@@ -1,45 +1,147 @@
+import asyncio
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Optional, Tuple
 import pymongo
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
 from loguru import logger
+from ..core.config import settings
+from ..core.diversity import DiverseSelection, group_key, subnet_key
+from ..core.profiling import phase
 from ..db.mongodb import proxy_collection
-from ..models.proxy import Proxy, ProxyStatus, ProxyValidationResult
+from ..models.proxy import Proxy, ProxyDiversity, ProxyEventKind, ProxyProtocol, ProxyProtocolStatus, ProxyReport, ProxyStatus, ProxyValidationResult
+from .dead_proxy_cache import DeadProxyCache
+from .geo_service import GeoService
+from .history_service import HistoryService
+from .rescoring_service import RescoringService
+from .snapshot_service import SnapshotService
+from .stats_service import StatsService
+from .subscription_service import SubscriptionService
+from .sync_service import SyncService
 
 class ProxyService:
     @staticmethod
     async def get_proxies(
         status: Optional[ProxyStatus] = ProxyStatus.ACTIVE,
         min_score: int = 50,
-        limit: int = 10
+        limit: int = 10,
+        protocol: Optional[ProxyProtocol] = None,
+        country: Optional[str] = None,
+        asn: Optional[int] = None,
+        diversity: Optional[ProxyDiversity] = None,
+        max_per_group: int = 1
     ) -> List[Proxy]:
-        """Get proxies filtered by status and minimum score"""
+        """
+        Get proxies filtered by status, minimum score, supported protocol, country and ASN
+
+        With diversity set, the batch is spread across subnets or ASNs: at most
+        max_per_group proxies per group, taken round-robin by score from the
+        best limit·DIVERSITY_CANDIDATE_FACTOR candidates.
+        """
+        # Sin MongoDB se sirve desde el snapshot local en modo solo lectura
+        if SnapshotService.is_degraded():
+            return SnapshotService.get_proxies(status=status, min_score=min_score, limit=limit, protocol=protocol,
+                                               country=country, asn=asn, diversity=diversity,
+                                               max_per_group=max_per_group)
+        
         query = {}
         
         if status:
             query["status"] = status
+        
+        # Usan los índices (country|asn, status, score)
+        if country:
+            query["country"] = country.upper()
+        
+        if asn is not None:
+            query["asn"] = asn
             
         if min_score > 0:
             query["score"] = {"$gte": min_score}
+        
+        if protocol:
+            # Usa el índice multikey sobre protocols.protocol/protocols.status. El estado por
+            # protocolo solo es active o inactive: con otro estado basta el del documento
+            protocol_match = {"protocol": protocol}
+            if status in (ProxyStatus.ACTIVE, ProxyStatus.INACTIVE):
+                protocol_match["status"] = status
+            query["$or"] = [
+                {"protocols": {"$elemMatch": protocol_match}},
+                # Documentos anteriores a la validación por protocolo
+                {"protocols": {"$in": [None, []]}, "protocol": protocol}
+            ]
             
-        cursor = proxy_collection.find(query).sort("score", pymongo.DESCENDING).limit(limit)
-        proxies = await cursor.to_list(length=limit)
+        async def read() -> List[dict]:
+            if diversity:
+                return await ProxyService._find_diverse(query, limit, diversity, max_per_group)
+            # El historial vive en proxy_events; no se envía el array heredado
+            cursor = proxy_collection.find(query, {"validation_history": 0}).sort("score", pymongo.DESCENDING).limit(limit)
+            with phase("db"):
+                return await cursor.to_list(length=limit)
+        
+        # Con snapshot no se espera a un MongoDB caído o lento: se pasa a servir desde él
+        timeout = settings.MONGODB_READ_TIMEOUT_MS / 1000 if SnapshotService.is_loaded() else None
+        try:
+            proxies = await asyncio.wait_for(read(), timeout)
+        except (PyMongoError, asyncio.TimeoutError) as e:
+            if not SnapshotService.is_loaded():
+                raise
+            SnapshotService.mark_unavailable(e)
+            return SnapshotService.get_proxies(status=status, min_score=min_score, limit=limit, protocol=protocol,
+                                               country=country, asn=asn, diversity=diversity,
+                                               max_per_group=max_per_group)
         
-        return [Proxy(**proxy) for proxy in proxies]
+        with phase("serialization"):
+            return [Proxy(**proxy) for proxy in proxies]
+    
+    @staticmethod
+    async def _find_diverse(query: dict, limit: int, diversity: ProxyDiversity, max_per_group: int) -> List[dict]:
+        """Read candidates by score only until limit groups are filled, then pick diverse proxies from them"""
+        candidate_limit = max(limit, min(limit * settings.DIVERSITY_CANDIDATE_FACTOR, settings.DIVERSITY_MAX_CANDIDATES))
+        mode = ProxyDiversity(diversity).value
+        selection = DiverseSelection(
+            lambda doc: group_key(mode, subnet_key(doc["ip"]), doc.get("asn")),
+            limit,
+            max_per_group
+        )
+        
+        # Lotes pequeños: con candidatos de redes distintas basta con poco más de limit documentos
+        cursor = (proxy_collection.find(query, {"validation_history": 0})
+                  .sort("score", pymongo.DESCENDING)
+                  .limit(candidate_limit)
+                  .batch_size(min(candidate_limit, 2 * limit)))
+        try:
+            with phase("db"):
+                async for doc in cursor:
+                    if not selection.add(doc):
+                        break
+        finally:
+            await cursor.close()
+        return selection.selected()
     
     @staticmethod
     async def add_proxy(proxy: Proxy) -> bool:
         """Add a new proxy to the database"""
         try:
-            proxy_dict = proxy.dict()
+            # País normalizado y ASN desde la base geo local, sin red
+            GeoService.enrich(proxy)
+            proxy_dict = proxy.dict(exclude={"validation_history"})
             
-            # Use update_one with upsert to avoid duplicates
-            result = await proxy_collection.update_one(
-                {"ip": proxy.ip, "port": proxy.port},
-                {"$set": proxy_dict},
-                upsert=True
-            )
+            # Upsert to avoid duplicates; the previous version feeds the stats counters
+            async with SyncService.sequence() as (seq,):
+                proxy_dict["update_seq"] = seq
+                with phase("db"):
+                    before = await proxy_collection.find_one_and_update(
+                        {"ip": proxy.ip, "port": proxy.port},
+                        {"$set": proxy_dict},
+                        projection={**StatsService.FIELDS, **SubscriptionService.FIELDS},
+                        upsert=True,
+                        return_document=ReturnDocument.BEFORE
+                    )
+                SubscriptionService.publish(before, proxy_dict, seq)
+            StatsService.on_change(before, proxy_dict)
             
-            if result.upserted_id:
+            if before is None:
                 logger.info(f"Added new proxy: {proxy.ip}:{proxy.port}")
             else:
                 logger.debug(f"Updated existing proxy: {proxy.ip}:{proxy.port}")
@@ -51,14 +153,37 @@ class ProxyService:
     
     @staticmethod
     async def add_proxies(proxies: List[Proxy]) -> int:
-        """Add multiple proxies to the database"""
+        """Add multiple proxies to the database, skipping recently deleted dead ones"""
+        added, _ = await ProxyService.ingest_proxies(proxies)
+        return added
+    
+    @staticmethod
+    async def ingest_proxies(proxies: List[Proxy]) -> Tuple[int, int]:
+        """
+        Add multiple proxies, skipping recently deleted dead ones
+        
+        Returns:
+            Tuple[int, int]: Proxies added and proxies that could not be stored
+        """
         success_count = 0
+        skipped = 0
+        failed = 0
         
         for proxy in proxies:
+            if DeadProxyCache.contains(proxy.ip, proxy.port):
+                skipped += 1
+                continue
             if await ProxyService.add_proxy(proxy):
                 success_count += 1
+            else:
+                failed += 1
+        
+        if skipped:
+            logger.info(f"Skipped {skipped} proxies found in the dead proxy cache")
+        if failed:
+            logger.warning(f"Could not store {failed} of {len(proxies)} proxies")
                 
-        return success_count
+        return success_count, failed
     
     @staticmethod
     async def report_proxy_result(
@@ -67,13 +192,16 @@ class ProxyService:
         success: bool, 
         latency_ms: Optional[int] = None,
         error: Optional[str] = None,
-        blocked_by_google: bool = False
+        blocked_by_google: bool = False,
+        protocols: Optional[List[ProxyProtocolStatus]] = None,
+        kind: ProxyEventKind = ProxyEventKind.USAGE
     ) -> bool:
         """Report proxy success/failure and update its stats"""
         try:
             # Create validation result
             validation_result = ProxyValidationResult(
                 timestamp=datetime.utcnow(),
+                kind=kind,
                 success=success,
                 latency_ms=latency_ms,
                 error=error,
@@ -89,44 +217,56 @@ class ProxyService:
                 new_status = ProxyStatus.BLOCKED
             
             # Calculate new score
-            proxy = await proxy_collection.find_one({"ip": ip, "port": port})
-            new_score = 50  # Default score
+            with phase("db"):
+                proxy = await proxy_collection.find_one(
+                    {"ip": ip, "port": port},
+                    {"success_count": 1, "fail_count": 1, "avg_latency_ms": 1, **StatsService.FIELDS, **SubscriptionService.FIELDS}
+                )
+            update_fields = {
+                "status": new_status,
+                "last_checked": validation_result.timestamp
+            }
+            
+            # Media móvil exponencial de la latencia en lugar del historial completo
+            avg_latency_ms = proxy.get("avg_latency_ms") if proxy else None
+            if latency_ms is not None and success:
+                avg_latency_ms = latency_ms if avg_latency_ms is None else int(avg_latency_ms * 0.8 + latency_ms * 0.2)
+                update_fields["avg_latency_ms"] = avg_latency_ms
             
+            # Misma fórmula que el recálculo periódico, sin decaimiento (recién comprobado)
+            update_fields["score"] = 50  # Default score
             if proxy:
-                success_count = proxy.get("success_count", 0) + (1 if success else 0)
-                fail_count = proxy.get("fail_count", 0) + (0 if success else 1)
-                total = success_count + fail_count
-                
-                if total > 0:
-                    # Base score on success ratio
-                    success_ratio = success_count / total
-                    new_score = int(success_ratio * 100)
-                    
-                    # Adjust for latency if available
-                    if latency_ms is not None and success:
-                        latency_factor = max(0, min(1, (2000 - latency_ms) / 2000))
-                        new_score = int(new_score * 0.7 + latency_factor * 100 * 0.3)
+                update_fields["score"] = RescoringService.score_one(
+                    proxy.get("success_count", 0) + (1 if success else 0),
+                    proxy.get("fail_count", 0) + (0 if success else 1),
+                    avg_latency_ms,
+                    proxy.get("source")
+                )
+            
+            # Estado por protocolo; el principal pasa a ser el más rápido que funciona
+            if protocols:
+                update_fields["protocols"] = [p.dict() for p in protocols]
+                working = [p for p in protocols if p.status == ProxyStatus.ACTIVE]
+                if working:
+                    update_fields["protocol"] = min(working, key=lambda p: p.latency_ms or 0).protocol
             
             # Update proxy in database
-            result = await proxy_collection.update_one(
-                {"ip": ip, "port": port},
-                {
-                    "$set": {
-                        "status": new_status,
-                        "score": new_score,
-                        "last_checked": datetime.utcnow()
-                    },
-                    "$inc": {increment_field: 1},
-                    "$push": {
-                        "validation_history": {
-                            "$each": [validation_result.dict()],
-                            "$slice": -20  # Keep only the last 20 results
+            async with SyncService.sequence() as (seq,):
+                with phase("db"):
+                    result = await proxy_collection.update_one(
+                        {"ip": ip, "port": port},
+                        {
+                            "$set": {**update_fields, "update_seq": seq},
+                            "$inc": {increment_field: 1},
+                            "$unset": {"validation_history": ""}  # Limpia documentos con el formato anterior
                         }
-                    }
-                }
-            )
+                    )
+                if result.modified_count > 0:
+                    SubscriptionService.publish(proxy, {**proxy, **update_fields}, seq)
             
             if result.modified_count > 0:
+                StatsService.on_change(proxy, {**proxy, **update_fields})
+                await HistoryService.record(ip, port, validation_result)
                 logger.debug(f"Updated proxy status: {ip}:{port} -> {new_status}")
                 return True
             else:
@@ -135,4 +275,25 @@ class ProxyService:
                 
         except Exception as e:
             logger.error(f"Error reporting proxy result for {ip}:{port}: {e}")
-            return False
\ No newline at end of file
+            return False
+    
+    @staticmethod
+    async def report_proxy_results(reports: List[ProxyReport]) -> int:
+        """Report a batch of usage results, returning how many were applied"""
+        # Los resultados de un mismo proxy se aplican en orden (cada uno parte de la
+        # puntuación del anterior); proxies distintos se actualizan concurrentemente
+        by_proxy = {}
+        for report in reports:
+            by_proxy.setdefault((report.ip, report.port), []).append(report)
+        
+        semaphore = asyncio.Semaphore(settings.REPORT_BATCH_CONCURRENCY)
+        
+        async def apply(proxy_reports: List[ProxyReport]) -> int:
+            async with semaphore:
+                applied = 0
+                for report in proxy_reports:
+                    if await ProxyService.report_proxy_result(**report.dict()):
+                        applied += 1
+                return applied
+        
+        return sum(await asyncio.gather(*[apply(proxy_reports) for proxy_reports in by_proxy.values()]))
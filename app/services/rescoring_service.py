@@ -0,0 +1,245 @@
+import heapq
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from pymongo import UpdateOne
+from loguru import logger
+
+from ..core.config import settings
+from ..db.mongodb import proxy_collection
+from .stats_service import StatsService
+from .subscription_service import SubscriptionService
+from .sync_service import SyncService
+
+class RescoringService:
+    """Periodic batch rescoring of the whole pool with time decay"""
+
+    # Estadísticas compactas leídas por proxy
+    FIELDS = {"_id": 1, "score": 1, "success_count": 1, "fail_count": 1, "avg_latency_ms": 1, "last_checked": 1, "source": 1}
+    DEFAULT_PRIOR = 0.5
+
+    # Referencias de la última ejecución, compartidas con la puntuación de cada reporte
+    _priors: Optional[Dict[str, float]] = None
+    _latency_reference: Optional[np.ndarray] = None
+
+    @staticmethod
+    async def _source_priors() -> Dict[str, float]:
+        """Success ratio of every source, smoothed with a uniform Beta(1, 1) prior"""
+        pipeline = [{"$group": {
+            "_id": "$source",
+            "success": {"$sum": {"$ifNull": ["$success_count", 0]}},
+            "fail": {"$sum": {"$ifNull": ["$fail_count", 0]}}
+        }}]
+        priors = {}
+        async for row in proxy_collection.aggregate(pipeline):
+            priors[row["_id"]] = (row["success"] + 1) / (row["success"] + row["fail"] + 2)
+        return priors
+
+    @staticmethod
+    async def _latency_reference_sample() -> np.ndarray:
+        """Sorted sample of pool latencies used to turn latencies into percentile ranks"""
+        pipeline = [
+            {"$match": {"avg_latency_ms": {"$ne": None}}},
+            {"$sample": {"size": settings.RESCORE_LATENCY_SAMPLE_SIZE}},
+            {"$project": {"_id": 0, "avg_latency_ms": 1}}
+        ]
+        latencies = [doc["avg_latency_ms"] async for doc in proxy_collection.aggregate(pipeline)]
+        return np.sort(np.asarray(latencies, dtype=np.float64))
+
+    @classmethod
+    async def refresh_references(cls) -> Tuple[Dict[str, float], np.ndarray]:
+        """Recompute the source priors and the latency reference of the pool"""
+        cls._priors = await cls._source_priors()
+        cls._latency_reference = await cls._latency_reference_sample()
+        return cls._priors, cls._latency_reference
+
+    @classmethod
+    async def warm_references(cls) -> None:
+        """Compute the references at startup so scoring a report never aggregates the pool"""
+        try:
+            await cls.refresh_references()
+        except Exception as e:
+            logger.error(f"Error computing rescoring references: {e}")
+
+    @classmethod
+    def score_one(cls, success: int, fail: int, latency_ms: Optional[float], source: Optional[str]) -> int:
+        """
+        Score of a proxy just checked, with the same formula as the batch rescoring
+
+        The references of the last rescoring run (or of warm_references() at
+        startup) are reused. Until they exist every source gets DEFAULT_PRIOR
+        and latency counts as the pool median.
+        """
+        priors = cls._priors or {}
+        latency_reference = cls._latency_reference if cls._latency_reference is not None else np.empty(0)
+
+        scores = cls.compute_scores(
+            np.array([success], dtype=np.float64),
+            np.array([fail], dtype=np.float64),
+            np.array([np.nan if latency_ms is None else latency_ms], dtype=np.float64),
+            np.zeros(1),
+            np.array([priors.get(source, cls.DEFAULT_PRIOR)]),
+            latency_reference
+        )
+        return int(scores[0])
+
+    @staticmethod
+    def compute_scores(
+        success: np.ndarray,
+        fail: np.ndarray,
+        latency: np.ndarray,
+        age_hours: np.ndarray,
+        prior: np.ndarray,
+        latency_reference: np.ndarray
+    ) -> np.ndarray:
+        """
+        Vectorized decayed scores
+
+        Args:
+            success: Success counts
+            fail: Failure counts
+            latency: Average latency in ms (NaN if unknown)
+            age_hours: Hours since the last check
+            prior: Success ratio prior of each proxy's source
+            latency_reference: Sorted latency sample of the whole pool
+
+        Returns:
+            np.ndarray: Integer scores in 0-100
+        """
+        # Ratio de éxito bayesiano: pocas observaciones tienden hacia la fiabilidad de la fuente
+        weight = settings.RESCORE_PRIOR_WEIGHT
+        reliability = (success + weight * prior) / (success + fail + weight)
+
+        # Latencia normalizada por percentil dentro del pool (más rápida = mejor)
+        latency_factor = np.full(latency.shape, 0.5)
+        known = ~np.isnan(latency)
+        if latency_reference.size:
+            ranks = np.searchsorted(latency_reference, latency[known], side="right") / latency_reference.size
+            latency_factor[known] = 1.0 - ranks
+
+        # Decaimiento exponencial por antigüedad de la última comprobación
+        decay = np.exp2(-age_hours / settings.RESCORE_HALF_LIFE_HOURS)
+
+        scores = 100.0 * (0.7 * reliability + 0.3 * latency_factor) * decay
+        return np.clip(np.rint(scores), 0, 100).astype(np.int64)
+
+    @classmethod
+    async def _write(cls, entries: List[Tuple[dict, int, int]], publish: bool) -> int:
+        """
+        Write (document, old score, new score) updates in one bulk operation
+
+        Each update only applies if the proxy still has the score and last check
+        that were read, so a proxy revalidated or reported during the scan keeps
+        its fresh score. Stats and events only follow the updates that applied.
+
+        Returns:
+            int: Number of proxies updated
+        """
+        async with SyncService.sequence(len(entries)) as seqs:
+            result = await proxy_collection.bulk_write(
+                [
+                    UpdateOne(
+                        {"_id": doc["_id"], "score": doc.get("score"), "last_checked": doc["last_checked"]},
+                        {"$set": {"score": new, "update_seq": seq}}
+                    )
+                    for (doc, _, new), seq in zip(entries, seqs)
+                ],
+                ordered=False
+            )
+            applied = list(zip(entries, seqs))
+            if result.matched_count < len(entries):
+                # Algunos proxies cambiaron durante el recálculo: solo se aplicaron los que llevan su número
+                stamped = {
+                    doc["_id"] async for doc in proxy_collection.find(
+                        {"_id": {"$in": [doc["_id"] for doc, _, _ in entries]}, "update_seq": {"$in": seqs}},
+                        {"_id": 1}
+                    )
+                }
+                applied = [(entry, seq) for entry, seq in applied if entry[0]["_id"] in stamped]
+            if publish:
+                for (doc, _, new), seq in applied:
+                    SubscriptionService.publish(doc, {**doc, "score": new}, seq)
+        StatsService.on_scores_changed([old for (_, old, _), _ in applied], [new for (_, _, new), _ in applied])
+        return len(applied)
+
+    @classmethod
+    async def rescore_all(cls, progress: Optional[Callable[[int, Optional[int]], None]] = None) -> Dict[str, int]:
+        """
+        Recompute decayed scores for every checked proxy and write back the changed ones
+
+        Without RESCORE_MAX_WRITES changes are written chunk by chunk. With it,
+        the largest changes of the whole pool are kept in a bounded heap and
+        written once the scan finishes.
+
+        Args:
+            progress: Optional callback receiving (processed, total)
+
+        Returns:
+            Dict with the number of proxies processed and updated
+        """
+        started = datetime.utcnow()
+        priors, latency_reference = await cls.refresh_references()
+
+        query = {"last_checked": {"$ne": None}}
+        total = await proxy_collection.count_documents(query)
+        # Solo se leen los campos de los eventos si hay clientes suscritos
+        fields = {**cls.FIELDS, **SubscriptionService.FIELDS} if SubscriptionService.has_subscribers() else cls.FIELDS
+        publish = "ip" in fields
+        cursor = proxy_collection.find(query, fields, batch_size=settings.RESCORE_CHUNK_SIZE)
+
+        results = {"processed": 0, "updated": 0}
+        write_budget = settings.RESCORE_MAX_WRITES
+        # Montículo de mínimos (cambio, orden, documento, anterior, nueva) con los mayores cambios vistos
+        largest: List[Tuple[int, int, dict, int, int]] = []
+        order = 0
+
+        while True:
+            docs = await cursor.to_list(length=settings.RESCORE_CHUNK_SIZE)
+            if not docs:
+                break
+
+            # Columnas del lote
+            old_scores = np.fromiter((d.get("score") or 0 for d in docs), dtype=np.int64, count=len(docs))
+            success = np.fromiter((d.get("success_count") or 0 for d in docs), dtype=np.float64, count=len(docs))
+            fail = np.fromiter((d.get("fail_count") or 0 for d in docs), dtype=np.float64, count=len(docs))
+            latency = np.fromiter(
+                (np.nan if d.get("avg_latency_ms") is None else d["avg_latency_ms"] for d in docs),
+                dtype=np.float64, count=len(docs)
+            )
+            checked = np.array([d["last_checked"] for d in docs], dtype="datetime64[ms]")
+            age_hours = (np.datetime64(started, "ms") - checked) / np.timedelta64(1, "h")
+            prior = np.fromiter((priors.get(d.get("source"), cls.DEFAULT_PRIOR) for d in docs), dtype=np.float64, count=len(docs))
+
+            new_scores = cls.compute_scores(success, fail, latency, np.maximum(age_hours, 0), prior, latency_reference)
+
+            # Solo se escriben los cambios relevantes
+            delta = np.abs(new_scores - old_scores)
+            changed = np.flatnonzero(delta >= settings.RESCORE_MIN_DELTA)
+
+            if write_budget is None:
+                if changed.size:
+                    results["updated"] += await cls._write(
+                        [(docs[i], int(old_scores[i]), int(new_scores[i])) for i in changed], publish
+                    )
+            elif write_budget > 0:
+                for i in changed:
+                    entry = (int(delta[i]), order, docs[i], int(old_scores[i]), int(new_scores[i]))
+                    order += 1
+                    if len(largest) < write_budget:
+                        heapq.heappush(largest, entry)
+                    elif entry[0] > largest[0][0]:
+                        heapq.heapreplace(largest, entry)
+
+            results["processed"] += len(docs)
+            if progress:
+                progress(results["processed"], total)
+
+        # Los mayores cambios de todo el pool, en bloques del tamaño de lote
+        largest.sort(reverse=True)
+        for offset in range(0, len(largest), settings.RESCORE_CHUNK_SIZE):
+            chunk = largest[offset:offset + settings.RESCORE_CHUNK_SIZE]
+            results["updated"] += await cls._write([(doc, old, new) for _, _, doc, old, new in chunk], publish)
+
+        elapsed = (datetime.utcnow() - started).total_seconds()
+        logger.info(f"Rescored {results['processed']} proxies in {elapsed:.1f}s, {results['updated']} scores updated")
+        return results
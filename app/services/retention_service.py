@@ -0,0 +1,158 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional
+from loguru import logger
+
+from ..core.config import settings
+from ..db.mongodb import proxy_archive_collection, proxy_collection
+from ..models.retention import RetentionPolicy, RetentionPolicyReport, RetentionReport
+from .dead_proxy_cache import DeadProxyCache
+from .stats_service import StatsService
+from .subscription_service import SubscriptionService
+from .sync_service import SyncService
+
+class RetentionService:
+    """Single retention engine applying the declarative RETENTION_POLICIES"""
+
+    _last_report: Optional[RetentionReport] = None
+
+    @staticmethod
+    def get_policies() -> List[RetentionPolicy]:
+        """Parse the configured policies"""
+        return [RetentionPolicy(**policy) for policy in settings.RETENTION_POLICIES]
+
+    @staticmethod
+    async def drop_ttl_indexes() -> None:
+        """
+        Drop the TTL indexes created by the former ttl_index policy option
+
+        Documents expired by MongoDB leave no sync tombstone and no subscription
+        event, so delta-sync clients would keep them forever. Every policy is
+        applied by run() instead.
+        """
+        indexes = await proxy_collection.index_information()
+        for name, info in indexes.items():
+            if name.startswith("retention_") and "expireAfterSeconds" in info:
+                await proxy_collection.drop_index(name)
+                logger.warning(f"Dropped TTL index {name}; its retention policy is now applied by the retention job")
+
+    @classmethod
+    async def run(
+        cls,
+        names: Optional[Iterable[str]] = None,
+        progress: Optional[Callable[[int, Optional[int]], None]] = None,
+        scheduled_only: bool = False
+    ) -> RetentionReport:
+        """
+        Apply retention policies, deleting in rate-limited batches along the _id index
+
+        Args:
+            names: Policies to apply; all enabled ones if None
+            progress: Optional callback receiving (policies done, total policies)
+            scheduled_only: Only apply the policies marked as scheduled
+
+        Returns:
+            RetentionReport: What each policy removed and how long it took
+        """
+        policies = [
+            p for p in cls.get_policies()
+            if p.enabled and (names is None or p.name in names) and (p.scheduled or not scheduled_only)
+        ]
+        report = RetentionReport()
+        start = time.perf_counter()
+
+        for done, policy in enumerate(policies):
+            if progress:
+                progress(done, len(policies))
+
+            try:
+                policy_report = await cls._apply(policy)
+            except Exception as e:
+                logger.error(f"Error applying retention policy {policy.name}: {e}")
+                continue
+
+            report.policies.append(policy_report)
+            report.deleted += policy_report.deleted
+
+        if progress:
+            progress(len(policies), len(policies))
+
+        report.duration_ms = int((time.perf_counter() - start) * 1000)
+        cls._last_report = report
+        logger.info(f"Retention removed {report.deleted} proxies in {report.duration_ms}ms")
+        return report
+
+    @classmethod
+    async def _apply(cls, policy: RetentionPolicy) -> RetentionPolicyReport:
+        report = RetentionPolicyReport(name=policy.name)
+        start = time.perf_counter()
+        now = datetime.utcnow()
+        query = policy.build_query(now)
+        archive = settings.RETENTION_ARCHIVE_ENABLED if policy.archive is None else policy.archive
+
+        projection = {"_id": 1, "fail_count": 1, **StatsService.FIELDS, **SubscriptionService.FIELDS}
+        last_id = None
+
+        while True:
+            # Avanzar por rangos del índice _id en lugar de un delete_many sin límite
+            batch_query = dict(query)
+            if last_id is not None:
+                batch_query["_id"] = {"$gt": last_id}
+
+            cursor = proxy_collection.find(batch_query, projection).sort("_id", 1).limit(settings.RETENTION_BATCH_SIZE)
+            docs = await cursor.to_list(length=settings.RETENTION_BATCH_SIZE)
+            if not docs:
+                break
+            last_id = docs[-1]["_id"]
+
+            # Se repite el filtro por si algún proxy cambió desde la lectura
+            ids = [doc["_id"] for doc in docs]
+            result = await proxy_collection.delete_many({**query, "_id": {"$in": ids}})
+            report.deleted += result.deleted_count
+            report.batches += 1
+
+            deleted = docs
+            if result.deleted_count < len(docs):
+                kept = {doc["_id"] async for doc in proxy_collection.find({"_id": {"$in": ids}}, {"_id": 1})}
+                deleted = [doc for doc in docs if doc["_id"] not in kept]
+            if deleted:
+                async with SyncService.sequence(len(deleted)) as seqs:
+                    await SyncService.record_removals(deleted, seqs)
+                    for doc, seq in zip(deleted, seqs):
+                        SubscriptionService.publish(doc, None, seq)
+
+                # Solo los realmente borrados: un proxy revalidado entre la lectura y el borrado sigue en el pool
+                if archive:
+                    await proxy_archive_collection.insert_many(
+                        [cls._tombstone(doc, policy.name, now) for doc in deleted],
+                        ordered=False
+                    )
+                    report.archived += len(deleted)
+
+            if policy.record_dead:
+                DeadProxyCache.add_many((doc["ip"], doc["port"]) for doc in deleted)
+            for doc in deleted:
+                StatsService.on_change(doc, None)
+
+            if len(docs) < settings.RETENTION_BATCH_SIZE:
+                break
+            await asyncio.sleep(settings.RETENTION_BATCH_DELAY)
+
+        if policy.record_dead:
+            await DeadProxyCache.save()
+
+        report.duration_ms = int((time.perf_counter() - start) * 1000)
+        logger.info(f"Retention policy {policy.name} removed {report.deleted} proxies in {report.batches} batches ({report.duration_ms}ms)")
+        return report
+
+    @staticmethod
+    def _tombstone(doc: dict, policy: str, deleted_at: datetime) -> dict:
+        tombstone = {key: value for key, value in doc.items() if key != "_id"}
+        tombstone.update({"policy": policy, "deleted_at": deleted_at})
+        return tombstone
+
+    @classmethod
+    def get_last_report(cls) -> Optional[RetentionReport]:
+        """Report of the most recent retention run"""
+        return cls._last_report
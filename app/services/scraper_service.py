@@ -1,4 +1,4 @@
-from typing import Dict, List, Type
+from typing import Callable, Dict, List, Optional, Type
 import asyncio
 from loguru import logger
 
@@ -17,10 +17,13 @@ class ScraperService:
     }
     
     @classmethod
-    async def scrape_all(cls) -> int:
+    async def scrape_all(cls, progress: Optional[Callable[[int, Optional[int]], None]] = None) -> int:
         """
         Scrape proxies from all registered sources
         
+        Args:
+            progress: Optional callback receiving (sources done, total sources)
+        
         Returns:
             int: Total number of proxies scraped and added to database
         """
@@ -28,26 +31,42 @@ class ScraperService:
         
         logger.info(f"Starting scraping from {len(cls._scrapers)} sources")
         
-        for scraper_name, scraper_class in cls._scrapers.items():
+        for done, (scraper_name, scraper_class) in enumerate(list(cls._scrapers.items())):
+            if progress:
+                progress(done, len(cls._scrapers))
             try:
                 logger.info(f"Scraping from {scraper_name}")
-                scraper = scraper_class()
-                proxies = await scraper.scrape()
-                
-                if proxies:
-                    # Add all the proxies to the database
-                    added = await ProxyService.add_proxies(proxies)
-                    total_added += added
-                    logger.info(f"Added {added} proxies from {scraper_name}")
-                else:
-                    logger.warning(f"No proxies scraped from {scraper_name}")
+                total_added += await cls._scrape_and_store(scraper_name, scraper_class())
                     
             except Exception as e:
                 logger.error(f"Error scraping from {scraper_name}: {e}")
         
+        if progress:
+            progress(len(cls._scrapers), len(cls._scrapers))
+        
         logger.info(f"Scraping completed. Added {total_added} proxies in total")
         return total_added
     
+    @staticmethod
+    async def _scrape_and_store(name: str, scraper: BaseScraper) -> int:
+        """Scrape one source, store its proxies and then let it persist its incremental state"""
+        proxies = await scraper.scrape()
+        
+        added, failed = 0, 0
+        if proxies:
+            # Add all the proxies to the database
+            added, failed = await ProxyService.ingest_proxies(proxies)
+            logger.info(f"Added {added} proxies from {name}")
+        else:
+            logger.warning(f"No proxies scraped from {name}")
+        
+        # Con proxies sin guardar la marca no avanza: la siguiente ejecución los vuelve a traer
+        if failed:
+            logger.warning(f"Not advancing {name} scraper state, {failed} proxies were not stored")
+        else:
+            await scraper.commit_state()
+        return added
+    
     @classmethod
     async def scrape_source(cls, source_name: str) -> int:
         """
@@ -68,19 +87,9 @@ class ScraperService:
         
         try:
             scraper_class = cls._scrapers[source_name]
-            scraper = scraper_class()
             
             logger.info(f"Scraping from {source_name}")
-            proxies = await scraper.scrape()
-            
-            if proxies:
-                # Add all the proxies to the database
-                added = await ProxyService.add_proxies(proxies)
-                logger.info(f"Added {added} proxies from {source_name}")
-                return added
-            else:
-                logger.warning(f"No proxies scraped from {source_name}")
-                return 0
+            return await cls._scrape_and_store(source_name, scraper_class())
                 
         except Exception as e:
             logger.error(f"Error scraping from {source_name}: {e}")
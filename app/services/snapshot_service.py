@@ -0,0 +1,330 @@
+import asyncio
+import ipaddress
+import os
+import socket
+import struct
+import time
+from typing import List, Optional
+import numpy as np
+from loguru import logger
+
+from ..core.config import settings
+from ..core.diversity import group_key, select_diverse
+from ..db.mongodb import client, proxy_collection
+from ..models.proxy import Proxy, ProxyDiversity, ProxyProtocol, ProxyProtocolStatus, ProxyStatus
+
+# Cabecera: magic, versión, número de registros, fecha de creación (epoch)
+HEADER = struct.Struct("<6sHQd")
+HEADER_SIZE = 32
+MAGIC = b"NXSNAP"
+VERSION = 2
+
+# Registro empaquetado de 27 bytes: IPv6 (IPv4 mapeada), puerto, puntuación,
+# bits de protocolo (4 bajos: soportados, 4 altos: índice del principal), estado, país y ASN (0 si no se conoce)
+RECORD_DTYPE = np.dtype([
+    ("ip", "S16"),
+    ("port", "<u2"),
+    ("score", "u1"),
+    ("protocols", "u1"),
+    ("status", "u1"),
+    ("country", "S2"),
+    ("asn", "<u4")
+])
+
+PROTOCOLS = list(ProxyProtocol)
+STATUSES = list(ProxyStatus)
+PROTOCOL_CODES = {protocol.value: i for i, protocol in enumerate(PROTOCOLS)}
+STATUS_CODES = {status.value: i for i, status in enumerate(STATUSES)}
+IPV4_MAPPED_PREFIX = b"\x00" * 10 + b"\xff\xff"
+SCAN_CHUNK = 65536
+
+class SnapshotService:
+    """Compact on-disk snapshot of the servable pool for warm starts and Mongo outages"""
+
+    _records: Optional[np.ndarray] = None
+    _created_at: Optional[float] = None
+    _degraded: bool = False
+
+    @staticmethod
+    def _pack_ip(ip: str) -> Optional[bytes]:
+        try:
+            return IPV4_MAPPED_PREFIX + socket.inet_pton(socket.AF_INET, ip)
+        except OSError:
+            pass
+        try:
+            return socket.inet_pton(socket.AF_INET6, ip)
+        except OSError:
+            return None
+
+    @staticmethod
+    def _unpack_ip(packed: bytes) -> str:
+        address = ipaddress.IPv6Address(packed.ljust(16, b"\x00"))
+        return str(address.ipv4_mapped or address)
+
+    @staticmethod
+    def _protocol_bits(doc: dict) -> int:
+        entries = doc.get("protocols") or [{"protocol": doc.get("protocol", ProxyProtocol.HTTP.value)}]
+        bits = 0
+        for entry in entries:
+            # Se descartan los protocolos que ya fallaron
+            if entry.get("status") == ProxyStatus.INACTIVE.value:
+                continue
+            code = PROTOCOL_CODES.get(entry.get("protocol"))
+            if code is not None:
+                bits |= 1 << code
+
+        primary = PROTOCOL_CODES.get(doc.get("protocol"), 0)
+        return bits | (primary << 4)
+
+    @staticmethod
+    def _subnet(packed: bytes) -> bytes:
+        """subnet_key of a packed address: /24 of an IPv4-mapped address, /48 otherwise"""
+        packed = packed.ljust(16, b"\x00")
+        if packed.startswith(IPV4_MAPPED_PREFIX):
+            return packed[12:15]
+        return packed[:6]
+
+    @staticmethod
+    def _country(value) -> bytes:
+        if isinstance(value, str) and len(value) == 2 and value.isascii() and value.isalpha():
+            return value.upper().encode("ascii")
+        return b""
+
+    @classmethod
+    def _pack(cls, docs: List[dict]) -> np.ndarray:
+        rows = []
+        unknown = STATUS_CODES[ProxyStatus.UNKNOWN.value]
+        for doc in docs:
+            packed = cls._pack_ip(doc.get("ip", ""))
+            if packed is None:
+                continue
+            rows.append((
+                packed,
+                doc["port"],
+                max(0, min(100, doc.get("score") or 0)),
+                cls._protocol_bits(doc),
+                STATUS_CODES.get(doc.get("status"), unknown),
+                cls._country(doc.get("country")),
+                doc.get("asn") or 0
+            ))
+        return np.array(rows, dtype=RECORD_DTYPE)
+
+    @classmethod
+    async def write(cls) -> int:
+        """
+        Write the servable pool to SNAPSHOT_PATH, sorted by score
+
+        Returns:
+            int: Number of proxies written
+        """
+        path = settings.SNAPSHOT_PATH
+        tmp_path = f"{path}.tmp"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        query = {"status": {"$in": settings.SNAPSHOT_STATUSES}}
+        if settings.SNAPSHOT_MIN_SCORE > 0:
+            query["score"] = {"$gte": settings.SNAPSHOT_MIN_SCORE}
+        projection = {"_id": 0, "ip": 1, "port": 1, "score": 1, "status": 1, "country": 1, "asn": 1,
+                      "protocol": 1, "protocols.protocol": 1, "protocols.status": 1}
+
+        start = time.perf_counter()
+        count = 0
+        cursor = proxy_collection.find(query, projection).sort("score", -1).batch_size(10_000)
+
+        # Solo las lecturas del cursor corren en el event loop; empaquetar y escribir va a un hilo
+        loop = asyncio.get_running_loop()
+        f = await loop.run_in_executor(None, cls._open, tmp_path)
+        try:
+            while True:
+                docs = await cursor.to_list(length=10_000)
+                if not docs:
+                    break
+                count += await loop.run_in_executor(None, cls._write_chunk, f, docs)
+            await loop.run_in_executor(None, cls._finish, f, tmp_path, path, count)
+        except BaseException:
+            f.close()
+            raise
+
+        elapsed = (time.perf_counter() - start) * 1000
+        logger.info(f"Wrote pool snapshot with {count} proxies ({count * RECORD_DTYPE.itemsize / 1e6:.1f} MB) in {elapsed:.0f}ms")
+        return count
+
+    @staticmethod
+    def _open(tmp_path: str):
+        f = open(tmp_path, "wb")
+        f.write(b"\x00" * HEADER_SIZE)
+        return f
+
+    @classmethod
+    def _write_chunk(cls, f, docs: List[dict]) -> int:
+        records = cls._pack(docs)
+        f.write(records.tobytes())
+        return len(records)
+
+    @classmethod
+    def _finish(cls, f, tmp_path: str, path: str, count: int) -> None:
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, count, time.time()))
+        f.close()
+
+        # Sustitución atómica: los lectores con el fichero anterior mapeado no se ven afectados
+        os.replace(tmp_path, path)
+        cls.load()
+
+    @classmethod
+    def load(cls) -> bool:
+        """
+        Memory-map the snapshot file
+
+        Returns:
+            bool: True if a valid snapshot was loaded
+        """
+        path = settings.SNAPSHOT_PATH
+        if not os.path.exists(path):
+            return False
+
+        try:
+            with open(path, "rb") as f:
+                magic, version, count, created_at = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                logger.warning(f"Ignoring incompatible pool snapshot {path}")
+                return False
+
+            if count:
+                records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
+            else:
+                records = np.zeros(0, dtype=RECORD_DTYPE)
+        except Exception as e:
+            logger.error(f"Error loading pool snapshot {path}: {e}")
+            return False
+
+        cls._records = records
+        cls._created_at = created_at
+        logger.info(f"Loaded pool snapshot with {count} proxies from {time.time() - created_at:.0f}s ago")
+        return True
+
+    @classmethod
+    def is_loaded(cls) -> bool:
+        return cls._records is not None
+
+    @classmethod
+    def is_degraded(cls) -> bool:
+        """Whether reads are served from the snapshot because MongoDB is unavailable"""
+        return cls._degraded
+
+    @classmethod
+    def set_degraded(cls, degraded: bool) -> None:
+        if degraded != cls._degraded:
+            logger.warning("Entering degraded read-only mode" if degraded else "Leaving degraded read-only mode")
+        cls._degraded = degraded
+
+    @classmethod
+    def mark_unavailable(cls, reason: Exception) -> None:
+        """
+        Serve reads from the snapshot after a failed or slow MongoDB read
+
+        Works as a circuit breaker: requests stop waiting on MongoDB until a
+        ping succeeds, tried every MONGODB_RECONNECT_INTERVAL seconds.
+        """
+        if cls._degraded:
+            return
+        logger.error(f"MongoDB read failed, serving from pool snapshot: {reason!r}")
+        cls.set_degraded(True)
+        asyncio.create_task(cls._wait_for_mongodb())
+
+    @classmethod
+    async def _wait_for_mongodb(cls) -> None:
+        while cls._degraded:
+            await asyncio.sleep(settings.MONGODB_RECONNECT_INTERVAL)
+            try:
+                await client.admin.command("ping")
+            except Exception as e:
+                logger.warning(f"MongoDB still unavailable: {e}")
+                continue
+            cls.set_degraded(False)
+
+    @classmethod
+    def get_proxies(
+        cls,
+        status: Optional[ProxyStatus] = ProxyStatus.ACTIVE,
+        min_score: int = 50,
+        limit: int = 10,
+        protocol: Optional[ProxyProtocol] = None,
+        country: Optional[str] = None,
+        asn: Optional[int] = None,
+        diversity: Optional[ProxyDiversity] = None,
+        max_per_group: int = 1
+    ) -> List[Proxy]:
+        """Same filters and diversity modes as ProxyService.get_proxies, answered from the snapshot"""
+        records = cls._records
+        if records is None or not len(records):
+            return []
+
+        status_code = STATUS_CODES[ProxyStatus(status).value] if status else None
+        protocol_bit = 1 << PROTOCOL_CODES[ProxyProtocol(protocol).value] if protocol else 0
+        country_code = cls._country(country) if country else None
+        wanted = limit
+        if diversity:
+            wanted = max(limit, min(limit * settings.DIVERSITY_CANDIDATE_FACTOR, settings.DIVERSITY_MAX_CANDIDATES))
+
+        # Los registros están ordenados por puntuación descendente: se recorren por
+        # bloques y se para al llenar el límite o al bajar de min_score
+        selected = []
+        for offset in range(0, len(records), SCAN_CHUNK):
+            chunk = records[offset:offset + SCAN_CHUNK]
+            mask = chunk["score"] >= min_score
+            if status_code is not None:
+                mask &= chunk["status"] == status_code
+            if protocol_bit:
+                mask &= (chunk["protocols"] & protocol_bit) != 0
+            if country_code is not None:
+                mask &= chunk["country"] == country_code
+            if asn is not None:
+                mask &= chunk["asn"] == asn
+
+            selected.extend(offset + i for i in np.flatnonzero(mask)[:wanted - len(selected)])
+            if len(selected) >= wanted or chunk["score"][-1] < min_score:
+                break
+
+        if diversity:
+            mode = ProxyDiversity(diversity).value
+            selected = select_diverse(
+                selected,
+                lambda i: group_key(mode, cls._subnet(bytes(records[i]["ip"])), int(records[i]["asn"])),
+                limit,
+                max_per_group
+            )
+
+        return [cls._to_proxy(records[i]) for i in selected]
+
+    @classmethod
+    def _to_proxy(cls, record) -> Proxy:
+        bits = int(record["protocols"])
+        status = STATUSES[int(record["status"])]
+        country = record["country"].decode("ascii") or None
+        return Proxy(
+            ip=cls._unpack_ip(bytes(record["ip"])),
+            port=int(record["port"]),
+            protocol=PROTOCOLS[(bits >> 4) % len(PROTOCOLS)],
+            protocols=[
+                ProxyProtocolStatus(protocol=protocol)
+                for i, protocol in enumerate(PROTOCOLS) if bits & (1 << i)
+            ],
+            country=country,
+            asn=int(record["asn"]) or None,
+            status=status,
+            score=int(record["score"]),
+            source="snapshot"
+        )
+
+    @classmethod
+    async def run_writer(cls) -> None:
+        """Refresh the snapshot every SNAPSHOT_INTERVAL seconds"""
+        while True:
+            await asyncio.sleep(settings.SNAPSHOT_INTERVAL)
+            if cls._degraded:
+                continue
+            try:
+                await cls.write()
+            except Exception as e:
+                logger.error(f"Error writing pool snapshot: {e}")
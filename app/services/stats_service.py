@@ -0,0 +1,196 @@
+import asyncio
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from loguru import logger
+
+from ..core.config import settings
+from ..db.mongodb import proxy_collection
+
+SCORE_BUCKETS = 10
+
+class StatsService:
+    """
+    In-memory pool statistics maintained incrementally
+
+    Every write path passes the proxy document before and after the change
+    (None when it did not exist / no longer exists) and the counters are
+    adjusted by the difference. A periodic aggregation reconciles any drift.
+    """
+
+    # Campos necesarios para calcular la contribución de un documento
+    FIELDS = {"status": 1, "score": 1, "source": 1, "country": 1, "protocol": 1, "protocols.protocol": 1}
+
+    _counters: Dict[str, Counter] = {}
+    _total: int = 0
+    _reconciled_at: Optional[datetime] = None
+    # Cambios recibidos mientras corre la agregación de reconcile(); None fuera de ella
+    _pending: Optional[Dict[str, Counter]] = None
+    _pending_total: int = 0
+
+    @staticmethod
+    def _value(value) -> str:
+        if value is None:
+            return "unknown"
+        return str(getattr(value, "value", value))
+
+    @classmethod
+    def _score_bucket(cls, score) -> str:
+        bucket = min(int(score or 0) // SCORE_BUCKETS, 100 // SCORE_BUCKETS - 1)
+        low = bucket * SCORE_BUCKETS
+        high = 100 if bucket == 100 // SCORE_BUCKETS - 1 else low + SCORE_BUCKETS - 1
+        return f"{low}-{high}"
+
+    @classmethod
+    def _contribution(cls, doc: Dict) -> Iterator[Tuple[str, str]]:
+        """Counter keys a proxy document contributes to"""
+        yield "status", cls._value(doc.get("status"))
+        yield "source", cls._value(doc.get("source"))
+        yield "country", cls._value(doc.get("country"))
+        yield "score", cls._score_bucket(doc.get("score"))
+
+        protocols = [p.get("protocol") for p in doc.get("protocols") or [] if p.get("protocol")]
+        for protocol in protocols or [doc.get("protocol")]:
+            yield "protocol", cls._value(protocol)
+
+    @staticmethod
+    def _adjust(counters: Dict[str, Counter], dimension: str, key: str, delta: int) -> None:
+        counter = counters.setdefault(dimension, Counter())
+        counter[key] += delta
+        if counter[key] <= 0:
+            del counter[key]
+
+    @classmethod
+    def _apply(cls, dimension: str, key: str, delta: int) -> None:
+        cls._adjust(cls._counters, dimension, key, delta)
+        if cls._pending is not None:
+            cls._pending[dimension][key] += delta
+
+    @classmethod
+    def on_change(cls, before: Optional[Dict], after: Optional[Dict]) -> None:
+        """
+        Apply the difference between two versions of a proxy document
+
+        Args:
+            before: Document before the write, or None if it was inserted
+            after: Document after the write, or None if it was deleted
+        """
+        if before is not None:
+            cls._total -= 1
+            cls._pending_total -= 1
+            for dimension, key in cls._contribution(before):
+                cls._apply(dimension, key, -1)
+
+        if after is not None:
+            cls._total += 1
+            cls._pending_total += 1
+            for dimension, key in cls._contribution(after):
+                cls._apply(dimension, key, 1)
+
+    @classmethod
+    def on_scores_changed(cls, old_scores: Iterable[int], new_scores: Iterable[int]) -> None:
+        """Move proxies between score histogram buckets after a score-only update"""
+        for old, new in zip(old_scores, new_scores):
+            old_bucket, new_bucket = cls._score_bucket(old), cls._score_bucket(new)
+            if old_bucket != new_bucket:
+                cls._apply("score", old_bucket, -1)
+                cls._apply("score", new_bucket, 1)
+
+    @classmethod
+    def is_ready(cls) -> bool:
+        """Whether counters have been reconciled at least once"""
+        return cls._reconciled_at is not None
+
+    @classmethod
+    def count(cls, dimension: str, key: str) -> int:
+        """Current count for one key of a dimension"""
+        return cls._counters.get(dimension, Counter()).get(key, 0)
+
+    @classmethod
+    def get_stats(cls) -> Dict:
+        """Snapshot of the pool statistics"""
+        return {
+            "total": cls._total,
+            "by_status": dict(cls._counters.get("status", {})),
+            "by_source": dict(cls._counters.get("source", {})),
+            "by_country": dict(cls._counters.get("country", {})),
+            "by_protocol": dict(cls._counters.get("protocol", {})),
+            "score_histogram": dict(sorted(
+                cls._counters.get("score", {}).items(),
+                key=lambda item: int(item[0].split("-")[0])
+            )),
+            "reconciled_at": cls._reconciled_at
+        }
+
+    @classmethod
+    async def reconcile(cls) -> None:
+        """
+        Recompute every counter with a single aggregation pipeline
+
+        Changes applied while the aggregation runs are recorded and added to its
+        result, so they are not lost until the next reconciliation. A change to a
+        document the aggregation had not scanned yet may be counted twice; the
+        next reconciliation corrects it.
+        """
+        def group_by(field):
+            return [{"$group": {"_id": field, "n": {"$sum": 1}}}]
+
+        pipeline = [{"$facet": {
+            "total": [{"$count": "n"}],
+            "status": group_by("$status"),
+            "source": group_by("$source"),
+            "country": group_by("$country"),
+            "score": group_by({"$min": [
+                {"$floor": {"$divide": [{"$ifNull": ["$score", 0]}, SCORE_BUCKETS]}},
+                100 // SCORE_BUCKETS - 1
+            ]}),
+            "protocol": [
+                {"$project": {"p": {"$cond": [
+                    {"$gt": [{"$size": {"$ifNull": ["$protocols", []]}}, 0]},
+                    "$protocols.protocol",
+                    ["$protocol"]
+                ]}}},
+                {"$unwind": "$p"},
+                *group_by("$p")
+            ]
+        }}]
+
+        dimensions = ("status", "source", "country", "protocol", "score")
+        cls._pending = {dimension: Counter() for dimension in dimensions}
+        cls._pending_total = 0
+        try:
+            result = (await proxy_collection.aggregate(pipeline).to_list(length=1))[0]
+            pending, pending_total = cls._pending, cls._pending_total
+        finally:
+            cls._pending = None
+
+        counters = {}
+        for dimension in ("status", "source", "country", "protocol"):
+            counters[dimension] = Counter({cls._value(row["_id"]): row["n"] for row in result[dimension]})
+        counters["score"] = Counter({
+            cls._score_bucket(int(row["_id"]) * SCORE_BUCKETS): row["n"] for row in result["score"]
+        })
+        total = result["total"][0]["n"] if result["total"] else 0
+
+        for dimension, deltas in pending.items():
+            for key, delta in deltas.items():
+                if delta:
+                    cls._adjust(counters, dimension, key, delta)
+        total += pending_total
+
+        if cls.is_ready() and total != cls._total:
+            logger.info(f"Stats reconciliation corrected total from {cls._total} to {total}")
+
+        cls._counters = counters
+        cls._total = total
+        cls._reconciled_at = datetime.utcnow()
+
+    @classmethod
+    async def run_reconciler(cls) -> None:
+        """Reconcile the counters every STATS_RECONCILE_INTERVAL seconds"""
+        while True:
+            try:
+                await cls.reconcile()
+            except Exception as e:
+                logger.error(f"Error reconciling pool stats: {e}")
+            await asyncio.sleep(settings.STATS_RECONCILE_INTERVAL)
@@ -0,0 +1,157 @@
+import asyncio
+import json
+from collections import deque
+from itertools import islice
+from typing import AsyncIterator, Deque, Dict, Optional, Set, Tuple
+from loguru import logger
+
+from ..core.config import settings
+from ..models.sync import SubscriptionFilter
+from .sync_service import SyncService
+
+class SubscriptionGroup:
+    """Bounded event log shared by the subscribers of one filter"""
+
+    def __init__(self, filter: SubscriptionFilter):
+        self.filter = filter
+        self.subscribers: Set["Subscriber"] = set()
+        self.log: Deque[Tuple[str, int]] = deque(maxlen=settings.SUBSCRIPTION_BUFFER_SIZE)
+        self.head = 0  # Posición del siguiente evento
+        self.changed = asyncio.Event()
+
+    @property
+    def tail(self) -> int:
+        """Position of the oldest event still in the log"""
+        return self.head - len(self.log)
+
+    def append(self, message: str, cursor: int) -> None:
+        self.log.append((message, cursor))
+        self.head += 1
+        # Se despierta a los lectores actuales; los siguientes esperan un evento nuevo
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+class Subscriber:
+    """Read position of one connected client in its group's log"""
+
+    def __init__(self, group: SubscriptionGroup):
+        self.group = group
+        self.position = group.head
+        # Todo cambio con secuencia <= cursor ya se ha enviado al cliente
+        self.cursor = SyncService.watermark()
+
+class SubscriptionService:
+    """
+    Push pool changes to subscribed clients as server-sent events
+
+    Write paths call publish() with the proxy document before and after the
+    change, like StatsService.on_change, inside their SyncService.sequence()
+    block. Subscribers with the same filter share one bounded log, so an event
+    costs one match and one append per distinct filter regardless of the number
+    of subscribers. A subscriber that falls more than SUBSCRIPTION_BUFFER_SIZE
+    events behind gets an overflow event with the cursor to resume from via
+    /proxies/changes and is disconnected.
+    """
+
+    # Campos necesarios para evaluar los filtros y construir el evento
+    FIELDS = {"ip": 1, "port": 1, "status": 1, "score": 1, "country": 1, "asn": 1, "source": 1, "last_checked": 1,
+              "protocol": 1, "protocols.protocol": 1, "protocols.status": 1}
+
+    _groups: Dict[SubscriptionFilter, SubscriptionGroup] = {}
+    _count: int = 0
+
+    @classmethod
+    def has_subscribers(cls) -> bool:
+        return cls._count > 0
+
+    @classmethod
+    def get_metrics(cls) -> Dict[str, int]:
+        return {"subscribers": cls._count, "filters": len(cls._groups)}
+
+    @staticmethod
+    def format_event(event: str, data: str, seq: Optional[int] = None) -> str:
+        prefix = f"id: {seq}\n" if seq is not None else ""
+        return f"{prefix}event: {event}\ndata: {data}\n\n"
+
+    @classmethod
+    def subscribe(cls, filter: SubscriptionFilter) -> Optional[Subscriber]:
+        """Register a subscriber, or return None when the process is at capacity"""
+        if cls._count >= settings.SUBSCRIPTION_MAX_SUBSCRIBERS:
+            return None
+        group = cls._groups.get(filter)
+        if group is None:
+            group = cls._groups[filter] = SubscriptionGroup(filter)
+        subscriber = Subscriber(group)
+        group.subscribers.add(subscriber)
+        cls._count += 1
+        return subscriber
+
+    @classmethod
+    def unsubscribe(cls, subscriber: Subscriber) -> None:
+        group = subscriber.group
+        if subscriber not in group.subscribers:
+            return
+        group.subscribers.discard(subscriber)
+        if not group.subscribers:
+            del cls._groups[group.filter]
+        cls._count -= 1
+
+    @classmethod
+    def publish(cls, before: Optional[Dict], after: Optional[Dict], seq: int) -> None:
+        """
+        Push the change of a proxy document to matching subscribers
+
+        Args:
+            before: Document before the write, or None if it was inserted
+            after: Document after the write, or None if it was deleted
+            seq: Update sequence number of the write
+        """
+        if not cls._count:
+            return
+
+        # Cambios anteriores al watermark ya están en los logs antes que este evento
+        cursor = SyncService.watermark()
+        upsert = remove = None
+        for group in list(cls._groups.values()):
+            if after is not None and group.filter.matches(after):
+                if upsert is None:
+                    upsert = cls.format_event("upsert", json.dumps(SyncService.compact({**after, "update_seq": seq})), seq)
+                group.append(upsert, cursor)
+            elif before is not None and group.filter.matches(before):
+                # El proxy salió del filtro (o se eliminó): el cliente debe descartarlo
+                if remove is None:
+                    doc = before if after is None or "ip" not in after else after
+                    remove = cls.format_event("remove", json.dumps({"ip": doc["ip"], "port": doc["port"], "seq": seq}), seq)
+                group.append(remove, cursor)
+
+    @classmethod
+    async def stream(cls, subscriber: Subscriber) -> AsyncIterator[str]:
+        """
+        Server-sent event stream of a subscriber, with periodic heartbeats
+
+        Yields:
+            str: Encoded events, batched when the client is behind
+        """
+        group = subscriber.group
+        try:
+            yield cls.format_event("ready", json.dumps({"cursor": subscriber.cursor}))
+            while True:
+                if subscriber.position < group.tail:
+                    # Cliente lento: retoma desde el último cursor entregado con /proxies/changes
+                    logger.info(f"Disconnected slow subscriber at cursor {subscriber.cursor}")
+                    yield cls.format_event("overflow", json.dumps({"cursor": subscriber.cursor}))
+                    return
+
+                if subscriber.position == group.head:
+                    try:
+                        await asyncio.wait_for(group.changed.wait(), timeout=settings.SUBSCRIPTION_HEARTBEAT)
+                    except asyncio.TimeoutError:
+                        yield ": ping\n\n"
+                    continue
+
+                pending = list(islice(group.log, subscriber.position - group.tail, None))
+                subscriber.position = group.head
+                yield "".join(message for message, _ in pending)
+                subscriber.cursor = max(subscriber.cursor, pending[-1][1])
+        finally:
+            cls.unsubscribe(subscriber)
@@ -0,0 +1,299 @@
+import asyncio
+import csv
+import io
+import json
+import os
+import socket
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional, Set
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from loguru import logger
+
+from ..core.config import settings
+from ..db.mongodb import counters_collection, proxy_collection, proxy_tombstones_collection
+from ..models.proxy import ProxyStatus
+from ..models.sync import ProxyChanges, ProxyRemoval
+
+class SequenceOwnershipError(RuntimeError):
+    """Raised when another live process already writes to the same database"""
+
+CSV_FIELDS = ["ip", "port", "protocol", "protocols", "status", "score", "country", "asn", "source", "last_checked", "update_seq"]
+
+class SyncService:
+    """
+    Monotonic update sequence, streaming export and delta sync of the pool
+
+    Every write to a proxy stamps it with update_seq and every removal leaves a
+    tombstone with its own seq. Sequence numbers are reserved from MongoDB in
+    blocks; the watermark only advances past numbers whose writes finished, so a
+    client that syncs up to the watermark never skips an in-flight change.
+
+    The in-flight set and the subscription logs live in the process, so a
+    database is served by a single process: init() takes a lease in MongoDB
+    and refuses to start while another live process holds it.
+    """
+
+    PROJECTION = {"_id": 0, "ip": 1, "port": 1, "protocol": 1, "protocols.protocol": 1, "protocols.status": 1,
+                  "status": 1, "score": 1, "country": 1, "asn": 1, "source": 1, "last_checked": 1,
+                  "update_seq": 1}
+
+    _next: int = 1
+    _limit: int = 1
+    _inflight: Set[int] = set()
+    _lock: Optional[asyncio.Lock] = None
+    _last_prune: Optional[datetime] = None
+    _owner: str = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    @classmethod
+    async def init(cls) -> None:
+        """Take the writer lease and continue the sequence after the last number reserved by any previous run"""
+        await cls._acquire_lease()
+        doc = await counters_collection.find_one({"_id": "proxy_seq"})
+        value = doc["value"] if doc else 0
+        cls._next = cls._limit = value + 1
+
+    @classmethod
+    async def _renew_lease(cls) -> bool:
+        """Take or renew the writer lease if it is free, expired or already ours"""
+        now = datetime.utcnow()
+        expired = now - timedelta(seconds=settings.SYNC_LEASE_TIMEOUT)
+        try:
+            await counters_collection.find_one_and_update(
+                {"_id": "sync_lease", "$or": [{"owner": cls._owner}, {"heartbeat": {"$lt": expired}}]},
+                {"$set": {"owner": cls._owner, "heartbeat": now}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # El documento existe y pertenece a otro proceso vivo
+            return False
+        return True
+
+    @classmethod
+    async def _acquire_lease(cls) -> None:
+        # Un proceso anterior que terminó sin liberar el lease caduca en SYNC_LEASE_TIMEOUT
+        deadline = time.monotonic() + settings.SYNC_LEASE_TIMEOUT + 1
+        while not await cls._renew_lease():
+            if time.monotonic() > deadline:
+                lease = await counters_collection.find_one({"_id": "sync_lease"}) or {}
+                raise SequenceOwnershipError(
+                    f"Database {settings.MONGODB_DB} is already served by {lease.get('owner')}; "
+                    "run a single worker per database"
+                )
+            await asyncio.sleep(1)
+        logger.info(f"Acquired the writer lease as {cls._owner}")
+
+    @classmethod
+    async def run_lease_keeper(cls) -> None:
+        """Renew the writer lease every third of SYNC_LEASE_TIMEOUT"""
+        while True:
+            await asyncio.sleep(settings.SYNC_LEASE_TIMEOUT / 3)
+            try:
+                if not await cls._renew_lease():
+                    logger.error("Writer lease taken by another process; delta sync cursors may skip changes")
+            except Exception as e:
+                logger.error(f"Error renewing the writer lease: {e}")
+
+    @classmethod
+    async def release_lease(cls) -> None:
+        """Free the lease on shutdown so a restarted process does not wait for it to expire"""
+        await counters_collection.delete_one({"_id": "sync_lease", "owner": cls._owner})
+
+    @classmethod
+    async def _allocate(cls, count: int) -> List[int]:
+        if cls._lock is None:
+            cls._lock = asyncio.Lock()
+
+        async with cls._lock:
+            if cls._next + count > cls._limit:
+                block = max(settings.SYNC_SEQUENCE_BLOCK, count)
+                doc = await counters_collection.find_one_and_update(
+                    {"_id": "proxy_seq"},
+                    {"$inc": {"value": block}},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+                cls._limit = doc["value"] + 1
+                cls._next = cls._limit - block
+
+            seqs = list(range(cls._next, cls._next + count))
+            cls._next += count
+            cls._inflight.update(seqs)
+            return seqs
+
+    @classmethod
+    @asynccontextmanager
+    async def sequence(cls, count: int = 1) -> AsyncIterator[List[int]]:
+        """
+        Reserve update sequence numbers for a write
+
+        Usage:
+            async with SyncService.sequence() as (seq,):
+                await proxy_collection.update_one(..., {"$set": {"update_seq": seq}})
+        """
+        seqs = await cls._allocate(count)
+        try:
+            yield seqs
+        finally:
+            cls._inflight.difference_update(seqs)
+
+    @classmethod
+    def watermark(cls) -> int:
+        """Highest sequence number below which every write has finished"""
+        if cls._inflight:
+            return min(cls._inflight) - 1
+        return cls._next - 1
+
+    @classmethod
+    async def record_removals(cls, docs: List[Dict], seqs: List[int]) -> None:
+        """
+        Leave tombstones for deleted proxies so delta clients drop them
+
+        Args:
+            docs: Deleted proxy documents
+            seqs: Sequence numbers reserved for the removals with sequence()
+        """
+        if not docs:
+            return
+
+        now = datetime.utcnow()
+        await proxy_tombstones_collection.insert_many(
+            [{"ip": doc["ip"], "port": doc["port"], "seq": seq, "deleted_at": now} for doc, seq in zip(docs, seqs)],
+            ordered=False
+        )
+
+        if cls._last_prune is None or now - cls._last_prune > timedelta(hours=1):
+            cls._last_prune = now
+            await cls.prune_tombstones()
+
+    @staticmethod
+    async def prune_tombstones() -> int:
+        """Drop tombstones older than SYNC_TOMBSTONE_RETENTION and advance the resync horizon"""
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.SYNC_TOMBSTONE_RETENTION)
+        newest = await proxy_tombstones_collection.find_one(
+            {"deleted_at": {"$lt": cutoff}}, {"seq": 1}, sort=[("seq", -1)]
+        )
+        if not newest:
+            return 0
+
+        # Los clientes con un cursor anterior al horizonte necesitan una exportación completa
+        await counters_collection.update_one(
+            {"_id": "tombstone_horizon"},
+            {"$max": {"value": newest["seq"]}},
+            upsert=True
+        )
+        result = await proxy_tombstones_collection.delete_many({"seq": {"$lte": newest["seq"]}})
+        logger.info(f"Pruned {result.deleted_count} proxy tombstones")
+        return result.deleted_count
+
+    @staticmethod
+    def compact(doc: Dict) -> Dict:
+        """Compact JSON-ready representation of a proxy for clients"""
+        protocols = [
+            p["protocol"] for p in doc.get("protocols") or []
+            if p.get("status") != ProxyStatus.INACTIVE.value
+        ] or [doc.get("protocol", "http")]
+        last_checked = doc.get("last_checked")
+        return {
+            "ip": doc["ip"],
+            "port": doc["port"],
+            "protocol": doc.get("protocol", "http"),
+            "protocols": protocols,
+            "status": doc.get("status"),
+            "score": doc.get("score", 0),
+            "country": doc.get("country"),
+            "asn": doc.get("asn"),
+            "source": doc.get("source"),
+            "last_checked": last_checked.isoformat() if last_checked else None,
+            "update_seq": doc.get("update_seq", 0)
+        }
+
+    @classmethod
+    async def export(
+        cls,
+        fmt: str = "ndjson",
+        status: Optional[ProxyStatus] = None,
+        min_score: int = 0
+    ) -> AsyncIterator[str]:
+        """
+        Stream the pool over a server-side cursor with constant memory
+
+        Args:
+            fmt: "ndjson" or "csv"
+            status: Optional status filter
+            min_score: Minimum score
+
+        Yields:
+            str: Chunks of the encoded export
+        """
+        query = {}
+        if status:
+            query["status"] = status
+        if min_score > 0:
+            query["score"] = {"$gte": min_score}
+
+        cursor = proxy_collection.find(query, cls.PROJECTION).batch_size(settings.SYNC_EXPORT_BATCH_SIZE)
+
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            async for doc in cursor:
+                item = cls.compact(doc)
+                item["protocols"] = "|".join(item["protocols"])
+                writer.writerow(item)
+                if buffer.tell() >= 64 * 1024:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+            yield buffer.getvalue()
+        else:
+            lines = []
+            async for doc in cursor:
+                lines.append(json.dumps(cls.compact(doc)))
+                if len(lines) >= settings.SYNC_EXPORT_BATCH_SIZE:
+                    yield "\n".join(lines) + "\n"
+                    lines = []
+            if lines:
+                yield "\n".join(lines) + "\n"
+
+    @classmethod
+    async def get_changes(cls, since: int, limit: int = 1000) -> ProxyChanges:
+        """
+        Get proxies added, updated or removed after a sync cursor
+
+        Args:
+            since: Cursor returned by the export or the previous call
+            limit: Maximum number of upserts and of removals returned
+
+        Returns:
+            ProxyChanges: Changes in (since, cursor] and the next cursor
+        """
+        watermark = cls.watermark()
+
+        horizon = await counters_collection.find_one({"_id": "tombstone_horizon"})
+        if horizon and since < horizon["value"]:
+            return ProxyChanges(cursor=watermark, full_resync_required=True)
+
+        seq_range = {"$gt": since, "$lte": watermark}
+        upserted = await proxy_collection.find({"update_seq": seq_range}, cls.PROJECTION) \
+            .sort("update_seq", 1).limit(limit).to_list(length=limit)
+        removed = await proxy_tombstones_collection.find({"seq": seq_range}, {"_id": 0, "ip": 1, "port": 1, "seq": 1}) \
+            .sort("seq", 1).limit(limit).to_list(length=limit)
+
+        # Si alguna de las dos listas se cortó, el cursor no puede pasar de su último elemento
+        cursor = watermark
+        if len(upserted) == limit:
+            cursor = min(cursor, upserted[-1]["update_seq"])
+        if len(removed) == limit:
+            cursor = min(cursor, removed[-1]["seq"])
+
+        return ProxyChanges(
+            cursor=cursor,
+            has_more=cursor < watermark,
+            upserted=[cls.compact(doc) for doc in upserted if doc["update_seq"] <= cursor],
+            removed=[ProxyRemoval(**doc) for doc in removed if doc["seq"] <= cursor]
+        )
@@ -0,0 +1,242 @@
+import asyncio
+import ipaddress
+import json
+import socket
+import ssl
+import struct
+import time
+from typing import Optional, Tuple
+from loguru import logger
+
+from ..models.proxy import ProxyProtocol
+
+# Certificados sin verificar, igual que verify=False en la validación anterior
+_ssl_context = ssl.create_default_context()
+_ssl_context.check_hostname = False
+_ssl_context.verify_mode = ssl.CERT_NONE
+
+class ProbeError(Exception):
+    """Raised when a proxy handshake or test request fails"""
+
+class ProtocolProber:
+    """Native asyncio probes for HTTP, HTTP CONNECT, SOCKS4/4a and SOCKS5 proxies"""
+
+    test_host = "httpbin.org"
+    test_port = 443
+    test_path = "/ip"
+    timeout = 15
+    max_body_size = 64 * 1024
+
+    _resolved_ipv4: Optional[str] = None
+
+    @classmethod
+    async def probe(cls, ip: str, port: int, protocol: ProxyProtocol) -> Tuple[bool, Optional[int], Optional[str], bool]:
+        """
+        Probe a proxy over a single protocol
+
+        Args:
+            ip: Proxy IP address
+            port: Proxy port
+            protocol: Protocol to test
+
+        Returns:
+            Tuple containing:
+            - bool: Success (True if proxy works)
+            - Optional[int]: Latency in milliseconds (None if proxy doesn't work)
+            - Optional[str]: Error message (None if proxy works)
+            - bool: Whether the proxy is blocked or not
+        """
+        start = time.perf_counter()
+        writer = None
+
+        try:
+            status, body, writer = await asyncio.wait_for(
+                cls._request(ip, port, protocol),
+                timeout=cls.timeout
+            )
+            latency_ms = int((time.perf_counter() - start) * 1000)
+
+            if status != 200:
+                logger.debug(f"Proxy {ip}:{port} ({protocol.value}) returned status code {status}")
+                return False, latency_ms, f"Invalid status code: {status}", False
+
+            try:
+                json_data = json.loads(body)
+            except ValueError as e:
+                logger.debug(f"Proxy {ip}:{port} ({protocol.value}) returned invalid JSON: {e}")
+                return False, latency_ms, "Response is not valid JSON", False
+
+            if not isinstance(json_data, dict) or "origin" not in json_data:
+                logger.debug(f"Proxy {ip}:{port} ({protocol.value}) returned invalid response format")
+                return False, latency_ms, "Invalid response format", False
+
+            logger.debug(f"Proxy {ip}:{port} ({protocol.value}) is working (latency: {latency_ms}ms)")
+            return True, latency_ms, None, False
+
+        except asyncio.TimeoutError:
+            logger.debug(f"Proxy {ip}:{port} ({protocol.value}) timed out")
+            return False, None, "Timeout", False
+        except ProbeError as e:
+            logger.debug(f"Proxy error for {ip}:{port} ({protocol.value}): {e}")
+            return False, None, f"Proxy error: {e}", False
+        except Exception as e:
+            logger.debug(f"Error validating proxy {ip}:{port} ({protocol.value}): {e}")
+            return False, None, f"Error: {e}", False
+        finally:
+            if writer is not None:
+                writer.close()
+
+    @classmethod
+    async def _request(cls, ip: str, port: int, protocol: ProxyProtocol):
+        """Open the proxy connection, run the handshake and fetch the test URL"""
+        reader, writer = await asyncio.open_connection(ip, port)
+
+        try:
+            if protocol == ProxyProtocol.HTTP:
+                # Proxy HTTP clásico: petición con URI absoluta, sin túnel
+                await cls._send_get(writer, f"http://{cls.test_host}{cls.test_path}")
+                status, body = await cls._read_response(reader)
+                return status, body, writer
+
+            if protocol == ProxyProtocol.HTTPS:
+                await cls._http_connect(reader, writer)
+            elif protocol == ProxyProtocol.SOCKS4:
+                await cls._socks4_connect(reader, writer)
+            elif protocol == ProxyProtocol.SOCKS5:
+                await cls._socks5_connect(reader, writer)
+            else:
+                raise ProbeError(f"Unsupported protocol {protocol}")
+
+            # Túnel establecido: TLS extremo a extremo con el host de prueba
+            await writer.start_tls(_ssl_context, server_hostname=cls.test_host)
+            await cls._send_get(writer, cls.test_path)
+            status, body = await cls._read_response(reader)
+            return status, body, writer
+        except BaseException:
+            writer.close()
+            raise
+
+    @classmethod
+    async def _send_get(cls, writer: asyncio.StreamWriter, target: str) -> None:
+        # HTTP/1.0 evita respuestas chunked y cierra la conexión al terminar
+        writer.write(
+            f"GET {target} HTTP/1.0\r\n"
+            f"Host: {cls.test_host}\r\n"
+            "User-Agent: Mozilla/5.0\r\n"
+            "Accept: application/json\r\n"
+            "Connection: close\r\n\r\n".encode("ascii")
+        )
+        await writer.drain()
+
+    @staticmethod
+    async def _read_status_and_headers(reader: asyncio.StreamReader) -> Tuple[int, dict]:
+        status_line = await reader.readline()
+        parts = status_line.decode("latin-1").split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith("HTTP/") or not parts[1].isdigit():
+            raise ProbeError(f"Invalid HTTP status line: {status_line[:64]!r}")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        return int(parts[1]), headers
+
+    @classmethod
+    async def _read_response(cls, reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+        status, headers = await cls._read_status_and_headers(reader)
+
+        length = headers.get("content-length")
+        if length is not None and length.isdigit():
+            # La respuesta de prueba es pequeña: no se acepta que el proxy imponga un cuerpo enorme
+            if int(length) > cls.max_body_size:
+                raise ProbeError(f"Response body of {length} bytes exceeds {cls.max_body_size}")
+            body = await reader.readexactly(int(length))
+        else:
+            # Sin Content-Length la petición HTTP/1.0 con Connection: close termina en EOF
+            body = b""
+            while len(body) < cls.max_body_size:
+                chunk = await reader.read(cls.max_body_size - len(body))
+                if not chunk:
+                    break
+                body += chunk
+
+        return status, body
+
+    @classmethod
+    async def _http_connect(cls, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        target = f"{cls.test_host}:{cls.test_port}"
+        writer.write(f"CONNECT {target} HTTP/1.1\r\nHost: {target}\r\n\r\n".encode("ascii"))
+        await writer.drain()
+
+        status, _ = await cls._read_status_and_headers(reader)
+        if status != 200:
+            raise ProbeError(f"CONNECT rejected with status {status}")
+
+    @classmethod
+    async def _resolve_test_host(cls) -> Optional[str]:
+        """Resolve the test host to IPv4 once, as plain SOCKS4 cannot carry hostnames"""
+        if cls._resolved_ipv4 is None:
+            try:
+                loop = asyncio.get_running_loop()
+                infos = await loop.getaddrinfo(cls.test_host, cls.test_port, family=socket.AF_INET)
+                cls._resolved_ipv4 = infos[0][4][0]
+            except OSError:
+                return None
+        return cls._resolved_ipv4
+
+    @classmethod
+    async def _socks4_connect(cls, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        target_ip = await cls._resolve_test_host()
+
+        if target_ip is not None:
+            request = struct.pack(">BBH", 4, 1, cls.test_port) + ipaddress.IPv4Address(target_ip).packed + b"\x00"
+        else:
+            # SOCKS4a: IP 0.0.0.x y el hostname tras el user id
+            request = struct.pack(">BBH", 4, 1, cls.test_port) + b"\x00\x00\x00\x01" + b"\x00"
+            request += cls.test_host.encode("idna") + b"\x00"
+
+        writer.write(request)
+        await writer.drain()
+
+        reply = await reader.readexactly(8)
+        if reply[0] != 0:
+            raise ProbeError(f"Invalid SOCKS4 reply version {reply[0]}")
+        if reply[1] != 0x5A:
+            raise ProbeError(f"SOCKS4 request rejected (code {reply[1]:#x})")
+
+    @classmethod
+    async def _socks5_connect(cls, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # Saludo: un único método, sin autenticación
+        writer.write(b"\x05\x01\x00")
+        await writer.drain()
+
+        version, method = await reader.readexactly(2)
+        if version != 5:
+            raise ProbeError(f"Invalid SOCKS5 version {version}")
+        if method != 0:
+            raise ProbeError("SOCKS5 proxy requires authentication")
+
+        host = cls.test_host.encode("idna")
+        writer.write(b"\x05\x01\x00\x03" + bytes([len(host)]) + host + struct.pack(">H", cls.test_port))
+        await writer.drain()
+
+        version, reply, _, address_type = await reader.readexactly(4)
+        if version != 5:
+            raise ProbeError(f"Invalid SOCKS5 version {version}")
+        if reply != 0:
+            raise ProbeError(f"SOCKS5 request rejected (code {reply})")
+
+        # Descartar la dirección y puerto de enlace
+        if address_type == 1:
+            await reader.readexactly(4 + 2)
+        elif address_type == 4:
+            await reader.readexactly(16 + 2)
+        elif address_type == 3:
+            length = (await reader.readexactly(1))[0]
+            await reader.readexactly(length + 2)
+        else:
+            raise ProbeError(f"Invalid SOCKS5 address type {address_type}")
@@ -1,88 +1,55 @@
 import asyncio
-from datetime import datetime, timedelta
-import requests
+from datetime import datetime
 from loguru import logger
-from typing import Dict, Optional, Tuple
-import concurrent.futures
+from typing import Callable, Dict, List, Optional, Tuple
 
-from ..models.proxy import Proxy, ProxyStatus
+from ..models.proxy import Proxy, ProxyEventKind, ProxyProtocolStatus, ProxyStatus
 from ..services.proxy_service import ProxyService
+from ..services.retention_service import RetentionService
+from ..services.stats_service import StatsService
 from ..db.mongodb import proxy_collection
+from .protocol_prober import ProtocolProber
 
 class ProxyValidator:
     """Validator for checking if proxies are working"""
     
     @staticmethod
-    def _validate_proxy_sync(proxy_dict) -> Tuple[bool, Optional[int], Optional[str], bool]:
+    async def validate_protocols(proxy: Proxy) -> List[ProxyProtocolStatus]:
         """
-        Synchronous validation function that can be run in a thread pool
-        
+        Probe every protocol supported by a proxy concurrently
+
         Args:
-            proxy_dict: Dictionary with proxy information
-            
+            proxy: Proxy to validate
+
         Returns:
-            Tuple containing validation results
+            List[ProxyProtocolStatus]: Validation state of each protocol
         """
-        test_url = "https://httpbin.org/ip"
-        
-        ip = proxy_dict["ip"]
-        port = proxy_dict["port"]
-        protocol = proxy_dict["protocol"].lower()
-        
-        # Asegurar que el protocolo no tenga prefijos extraños
-        if "." in protocol:
-            protocol = protocol.split(".")[-1]
-        
-        proxies = {
-            "http": f"{protocol}://{ip}:{port}",
-            "https": f"{protocol}://{ip}:{port}"
-        }
-        
-        try:
-            start_time = datetime.utcnow()
-            
-            # Usar requests en lugar de httpx
-            response = requests.get(test_url, proxies=proxies, timeout=15, verify=False)
-            
-            # Calcular latencia
-            latency_ms = int((datetime.utcnow() - start_time).total_seconds() * 1000)
-            
-            # Verificar si la respuesta es válida
-            if response.status_code == 200:
-                try:
-                    # Verificar si la respuesta es un JSON válido con una IP
-                    json_data = response.json()
-                    if 'origin' in json_data:
-                        logger.debug(f"Proxy {ip}:{port} is working (latency: {latency_ms}ms)")
-                        return True, latency_ms, None, False
-                    else:
-                        logger.debug(f"Proxy {ip}:{port} returned invalid response format")
-                        return False, latency_ms, "Invalid response format", False
-                except Exception as e:
-                    logger.debug(f"Proxy {ip}:{port} returned invalid JSON: {e}")
-                    return False, latency_ms, "Response is not valid JSON", False
-            else:
-                logger.debug(f"Proxy {ip}:{port} returned status code {response.status_code}")
-                return False, latency_ms, f"Invalid status code: {response.status_code}", False
-                
-        except requests.exceptions.Timeout:
-            logger.debug(f"Proxy {ip}:{port} timed out")
-            return False, None, "Timeout", False
-        except requests.exceptions.ProxyError as e:
-            logger.debug(f"Proxy error for {ip}:{port}: {e}")
-            return False, None, f"Proxy error: {str(e)}", False
-        except Exception as e:
-            logger.debug(f"Error validating proxy {ip}:{port}: {e}")
-            return False, None, f"Error: {str(e)}", False
-    
-    @staticmethod
-    async def validate_proxy(proxy: Proxy) -> Tuple[bool, Optional[int], Optional[str], bool]:
+        protocols = proxy.supported_protocols
+        results = await asyncio.gather(*[
+            ProtocolProber.probe(proxy.ip, proxy.port, protocol)
+            for protocol in protocols
+        ])
+
+        checked_at = datetime.utcnow()
+        return [
+            ProxyProtocolStatus(
+                protocol=protocol,
+                status=ProxyStatus.ACTIVE if success else ProxyStatus.INACTIVE,
+                latency_ms=latency_ms,
+                error=error,
+                last_checked=checked_at
+            )
+            for protocol, (success, latency_ms, error, blocked) in zip(protocols, results)
+        ]
+
+    @classmethod
+    async def validate_proxy(cls, proxy: Proxy) -> Tuple[bool, Optional[int], Optional[str], bool]:
         """
-        Validate if a proxy is working
-        
+        Validate if a proxy is working over any of its protocols
+
         Args:
             proxy: Proxy to validate
-            
+
         Returns:
             Tuple containing:
             - bool: Success (True if proxy works)
@@ -90,24 +57,19 @@ class ProxyValidator:
             - Optional[str]: Error message (None if proxy works)
             - bool: Whether the proxy is blocked or not
         """
-        # Convertir el proxy a un diccionario para pasarlo al executor
-        proxy_dict = {
-            "ip": proxy.ip,
-            "port": proxy.port,
-            "protocol": str(proxy.protocol)
-        }
-        
-        # Ejecutar la validación en un thread pool para no bloquear asyncio
-        loop = asyncio.get_event_loop()
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            result = await loop.run_in_executor(
-                executor, 
-                ProxyValidator._validate_proxy_sync, 
-                proxy_dict
-            )
-            
-        return result
-    
+        statuses = await cls.validate_protocols(proxy)
+        return cls.summarize(statuses)
+
+    @staticmethod
+    def summarize(statuses: List[ProxyProtocolStatus]) -> Tuple[bool, Optional[int], Optional[str], bool]:
+        """Collapse per-protocol results into the overall (success, latency, error, blocked) tuple"""
+        working = [s for s in statuses if s.status == ProxyStatus.ACTIVE]
+        if working:
+            return True, min(s.latency_ms for s in working), None, False
+
+        errors = "; ".join(f"{s.protocol.value}: {s.error}" for s in statuses if s.error)
+        return False, None, errors or None, False
+
     @classmethod
     async def validate_and_update(cls, proxy: Proxy) -> bool:
         """
@@ -119,7 +81,8 @@ class ProxyValidator:
         Returns:
             bool: True if validation was successful, False otherwise
         """
-        success, latency_ms, error, blocked = await cls.validate_proxy(proxy)
+        statuses = await cls.validate_protocols(proxy)
+        success, latency_ms, error, blocked = cls.summarize(statuses)
         
         # Update proxy in database
         result = await ProxyService.report_proxy_result(
@@ -128,18 +91,25 @@ class ProxyValidator:
             success=success,
             latency_ms=latency_ms,
             error=error,
-            blocked_by_google=blocked
+            blocked_by_google=blocked,
+            protocols=statuses,
+            kind=ProxyEventKind.VALIDATION
         )
         
         return result
     
     @classmethod
-    async def validate_all(cls, batch_size: int = 10) -> Dict[str, int]:
+    async def validate_all(
+        cls,
+        batch_size: int = 10,
+        progress: Optional[Callable[[int, Optional[int]], None]] = None
+    ) -> Dict[str, int]:
         """
         Validate all proxies in the database
         
         Args:
             batch_size: Number of proxies to validate concurrently
+            progress: Optional callback receiving (processed, total) after each batch
             
         Returns:
             Dict containing counts of validation results
@@ -154,8 +124,7 @@ class ProxyValidator:
             "total": total_count,
             "success": 0,
             "fail": 0,
-            "blocked": 0,
-            "deleted": 0
+            "blocked": 0
         }
         
         # Procesar todos los proxies en lotes
@@ -181,34 +150,24 @@ class ProxyValidator:
             # Actualizar contador
             processed += len(batch)
             batch_number += 1
+            if progress:
+                progress(processed, total_count)
             
             # Registrar progreso cada 10 lotes o en el último lote
             if batch_number % 10 == 0 or len(batch) < batch_size:
                 logger.info(f"Validated {processed}/{total_count} proxies")
         
-        # Eliminar proxies que han fallado múltiples veces y no han funcionado
-        # en los últimos 3 días
-        three_days_ago = datetime.utcnow() - timedelta(days=3)
-        
-        delete_result = await proxy_collection.delete_many({
-            "status": "inactive",
-            "fail_count": {"$gt": 3},
-            "last_checked": {"$lt": three_days_ago}
-        })
-        
-        results["deleted"] = delete_result.deleted_count
-        logger.info(f"Deleted {results['deleted']} inactive proxies that failed multiple times")
-        
-        # Obtener estadísticas actualizadas
-        active_count = await proxy_collection.count_documents({"status": "active"})
-        inactive_count = await proxy_collection.count_documents({"status": "inactive"})
-        blocked_count = await proxy_collection.count_documents({"status": "blocked"})
-        
-        results["success"] = active_count
-        results["fail"] = inactive_count
-        results["blocked"] = blocked_count
+        # Obtener estadísticas actualizadas (contadores en memoria si están disponibles)
+        if StatsService.is_ready():
+            results["success"] = StatsService.count("status", ProxyStatus.ACTIVE.value)
+            results["fail"] = StatsService.count("status", ProxyStatus.INACTIVE.value)
+            results["blocked"] = StatsService.count("status", ProxyStatus.BLOCKED.value)
+        else:
+            results["success"] = await proxy_collection.count_documents({"status": "active"})
+            results["fail"] = await proxy_collection.count_documents({"status": "inactive"})
+            results["blocked"] = await proxy_collection.count_documents({"status": "blocked"})
         
-        logger.info(f"Validation completed: {results['success']} working, {results['fail']} failed, {results['blocked']} blocked, {results['deleted']} deleted")
+        logger.info(f"Validation completed: {results['success']} working, {results['fail']} failed, {results['blocked']} blocked")
         
         return results
     
@@ -221,11 +180,7 @@ class ProxyValidator:
             int: Number of proxies removed
         """
         # Eliminar proxies que han fallado más de 5 veces y tienen puntuación baja
-        result = await proxy_collection.delete_many({
-            "status": "inactive",
-            "fail_count": {"$gt": 5},
-            "score": {"$lt": 20}
-        })
+        retention = await RetentionService.run(names=["consistently_failing"])
         
-        logger.info(f"Cleanup removed {result.deleted_count} consistently failing proxies")
-        return result.deleted_count
\ No newline at end of file
+        logger.info(f"Cleanup removed {retention.deleted} consistently failing proxies")
+        return retention.deleted
\ No newline at end of file
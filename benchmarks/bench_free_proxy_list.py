@@ -0,0 +1,79 @@
+"""
+Micro-benchmark del parsing de free-proxy-list.net
+
+Compara el parsing antiguo (BeautifulSoup + un Proxy por fila) con la ruta
+lxml/XPath + conversión en bloque usada por FreeProxyListScraper.
+
+Uso:
+    python -m benchmarks.bench_free_proxy_list [--fixture PATH] [--repeat N]
+"""
+import argparse
+import statistics
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from bs4 import BeautifulSoup
+
+from app.models.proxy import Proxy, ProxyProtocol, ProxyStatus
+from app.scrapers.free_proxy_list_scraper import FreeProxyListScraper
+
+FIXTURE = Path(__file__).parent / "fixtures" / "free_proxy_list.html"
+
+def parse_bs4(text: str) -> List[Proxy]:
+    """Legacy parsing path, kept here as the benchmark baseline"""
+    proxies = []
+    soup = BeautifulSoup(text, 'lxml')
+    table = soup.find('table', {'id': 'proxylisttable'})
+    if not table:
+        return []
+
+    for row in table.find('tbody').find_all('tr'):
+        cells = row.find_all('td')
+        if len(cells) >= 8:
+            https = cells[6].text.strip().lower() == 'yes'
+            proxies.append(Proxy(
+                ip=cells[0].text.strip(),
+                port=int(cells[1].text.strip()),
+                protocol=ProxyProtocol.HTTPS if https else ProxyProtocol.HTTP,
+                country=cells[2].text.strip(),
+                anonymity=cells[4].text.strip().lower(),
+                status=ProxyStatus.UNKNOWN,
+                score=50,
+                source=FreeProxyListScraper.name
+            ))
+    return proxies
+
+def bench(name: str, func: Callable[[str], List[Proxy]], text: str, repeat: int) -> float:
+    """Run func repeat times and print timing statistics, returning the median in ms"""
+    timings = []
+    count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = len(func(text))
+        timings.append((time.perf_counter() - start) * 1000)
+
+    median = statistics.median(timings)
+    print(f"{name:<8} rows={count:<5} median={median:8.2f}ms  min={min(timings):8.2f}ms  max={max(timings):8.2f}ms")
+    return median
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixture", type=Path, default=FIXTURE, help="Saved HTML page to parse")
+    parser.add_argument("--repeat", type=int, default=50, help="Iterations per parser")
+    args = parser.parse_args()
+
+    text = args.fixture.read_text(encoding="utf-8")
+
+    # Ambos caminos deben producir el mismo resultado (la ruta antigua no rellena protocols)
+    exclude = {"created_at", "protocols"}
+    expected = [p.model_dump(exclude=exclude) for p in parse_bs4(text)]
+    actual = [p.model_dump(exclude=exclude) for p in FreeProxyListScraper.parse_html(text)]
+    assert expected == actual, "lxml parsing path diverges from the BeautifulSoup baseline"
+
+    baseline = bench("bs4", parse_bs4, text, args.repeat)
+    current = bench("lxml", FreeProxyListScraper.parse_html, text, args.repeat)
+    print(f"speedup: {baseline / current:.1f}x")
+
+if __name__ == "__main__":
+    main()
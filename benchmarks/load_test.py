@@ -0,0 +1,323 @@
+"""
+Prueba de carga de la API con control de regresión de latencia
+
+Genera carga en lazo abierto (las peticiones salen a ritmo fijo aunque las
+anteriores no hayan terminado, y la latencia se mide desde el instante
+programado para no ocultar colas) contra la app en proceso vía ASGI o contra
+un uvicorn local, sobre un pool sintético sembrado en MongoDB. Para cada
+endpoint y ritmo mide el throughput conseguido y los percentiles p50/p99/p999,
+y los compara con una línea base guardada.
+
+Uso:
+    MONGODB_DB=proxy_service_loadtest python -m benchmarks.load_test --seed 100000 --save-baseline
+    MONGODB_DB=proxy_service_loadtest python -m benchmarks.load_test --rates 200,500,1000
+    MONGODB_DB=proxy_service_loadtest python -m benchmarks.load_test --url http://localhost:8000 --endpoints proxy
+
+--seed se niega a sembrar la base de datos por defecto salvo con
+--allow-default-db, y con --url se comprueba que el servidor usa la misma
+MONGODB_DB que este proceso.
+
+Con PROFILING_ENABLED en el servidor (o en este proceso sin --url) cada fila
+incluye además la media por petición de las fases de la cabecera
+Server-Timing (auth, db, serialization y total).
+
+El proceso termina con código 1 si algún p99/p999 empeora más de --tolerance
+respecto a la línea base o el throughput cae por debajo de ella. Con código 2
+si la base de datos no es válida para la prueba.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from app.core.config import Settings, settings
+from app.db.mongodb import proxy_collection
+from app.models.proxy import ProxyProtocol, ProxyStatus
+
+BASELINE = Path(__file__).parent / "baselines" / "load_test.json"
+SEED_SOURCE = "loadtest"
+DEFAULT_DB = Settings.model_fields["MONGODB_DB"].default
+PERCENTILES = {"p50": 50, "p99": 99, "p999": 99.9}
+
+Request = Tuple[str, str, Dict]
+
+def synthetic_proxies(count: int) -> List[Dict]:
+    """Synthetic proxy documents with a mix of statuses, scores, protocols and countries"""
+    rng = random.Random(42)
+    protocols = [p.value for p in ProxyProtocol]
+    countries = ["US", "DE", "FR", "BR", "IN", "CN", "RU", "ID", "GB", "NL"]
+    now = datetime.utcnow()
+    docs = []
+    for i in range(count):
+        protocol = rng.choice(protocols)
+        success, fail = rng.randint(0, 50), rng.randint(0, 50)
+        docs.append({
+            "ip": f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}",
+            "port": rng.choice([80, 3128, 8080, 1080]),
+            "protocol": protocol,
+            "protocols": [{"protocol": protocol, "status": ProxyStatus.ACTIVE.value, "latency_ms": None,
+                           "error": None, "last_checked": now}],
+            "country": rng.choice(countries),
+            "anonymity": "elite",
+            "status": rng.choices([ProxyStatus.ACTIVE.value, ProxyStatus.INACTIVE.value], weights=[7, 3])[0],
+            "score": rng.randint(0, 100),
+            "success_count": success,
+            "fail_count": fail,
+            "avg_latency_ms": rng.randint(50, 3000),
+            "last_checked": now,
+            "created_at": now,
+            "source": SEED_SOURCE,
+            "metadata": {}
+        })
+    return docs
+
+async def seed(count: int) -> List[Tuple[str, int]]:
+    """Replace the previous synthetic pool, returning the seeded addresses"""
+    await proxy_collection.delete_many({"source": SEED_SOURCE})
+    docs = synthetic_proxies(count)
+    for offset in range(0, len(docs), 10_000):
+        await proxy_collection.insert_many(docs[offset:offset + 10_000], ordered=False)
+    print(f"seeded {count} synthetic proxies into {settings.MONGODB_DB}")
+    return [(doc["ip"], doc["port"]) for doc in docs]
+
+def endpoint_requests(addresses: List[Tuple[str, int]]) -> Dict[str, Callable[[], Request]]:
+    """Request factories per endpoint"""
+    def report() -> Request:
+        ip, port = random.choice(addresses)
+        success = random.random() < 0.7
+        params = {"ip": ip, "port": port, "success": success}
+        if success:
+            params["latency_ms"] = random.randint(50, 3000)
+        return "POST", "/api/proxy/report", params
+
+    return {
+        "proxy": lambda: ("GET", "/api/proxy", {"min_score": random.choice([0, 50, 80])}),
+        "proxies": lambda: ("GET", "/api/proxies", {"min_score": 50, "limit": 10}),
+        "report": report
+    }
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    """Durations in ms of a Server-Timing header ("auth;dur=0.12, db;dur=1.30, total;dur=2.01")"""
+    phases = {}
+    for entry in header.split(","):
+        name, _, duration = entry.strip().partition(";dur=")
+        try:
+            phases[name] = float(duration)
+        except ValueError:
+            continue
+    return phases
+
+async def run_rate(
+    client: httpx.AsyncClient,
+    make_request: Callable[[], Request],
+    rate: float,
+    duration: float,
+    max_inflight: int
+) -> Dict:
+    """
+    Open-loop load at a fixed arrival rate
+
+    Returns:
+        Dict with the achieved throughput, latency percentiles in ms and errors
+    """
+    loop = asyncio.get_running_loop()
+    latencies: List[float] = []
+    # Milisegundos por fase según la cabecera Server-Timing (solo con PROFILING_ENABLED en el servidor)
+    phase_totals: Dict[str, float] = {}
+    phase_count = 0
+    errors = 0
+    dropped = 0
+    inflight = 0
+    tasks = []
+
+    async def one(scheduled: float) -> None:
+        nonlocal errors, inflight, phase_count
+        method, path, params = make_request()
+        try:
+            response = await client.request(method, path, params=params)
+            if response.status_code >= 500 or response.status_code in (401, 422):
+                errors += 1
+            timing = response.headers.get("server-timing")
+            if timing:
+                phase_count += 1
+                for name, ms in parse_server_timing(timing).items():
+                    phase_totals[name] = phase_totals.get(name, 0.0) + ms
+        except httpx.HTTPError:
+            errors += 1
+        finally:
+            inflight -= 1
+        # Desde el instante programado: la espera en cola cuenta como latencia
+        latencies.append((loop.time() - scheduled) * 1000)
+
+    total = int(rate * duration)
+    start = loop.time()
+    for i in range(total):
+        scheduled = start + i / rate
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if inflight >= max_inflight:
+            dropped += 1
+            continue
+        inflight += 1
+        tasks.append(asyncio.create_task(one(scheduled)))
+
+    await asyncio.gather(*tasks)
+    elapsed = loop.time() - start
+
+    result = {"rate": rate, "throughput": round(len(latencies) / elapsed, 1), "errors": errors, "dropped": dropped}
+    if latencies:
+        values = np.percentile(np.array(latencies), list(PERCENTILES.values()))
+        result.update({name: round(float(v), 2) for name, v in zip(PERCENTILES, values)})
+    if phase_count:
+        result["phases"] = {name: round(total / phase_count, 3) for name, total in phase_totals.items()}
+    return result
+
+def compare(results: Dict, baseline: Dict, tolerance: float, slack_ms: float) -> List[str]:
+    """Tail latency, throughput and error regressions against the baseline"""
+    regressions = []
+    for endpoint, runs in results.items():
+        for rate, current in runs.items():
+            reference = baseline.get(endpoint, {}).get(rate)
+            if not reference:
+                continue
+            for name in ("p99", "p999"):
+                if name in current and name in reference:
+                    limit = reference[name] * (1 + tolerance) + slack_ms
+                    if current[name] > limit:
+                        regressions.append(f"{endpoint}@{rate}/s {name} {current[name]:.2f}ms > {limit:.2f}ms "
+                                           f"(baseline {reference[name]:.2f}ms)")
+            if current["throughput"] < reference["throughput"] * (1 - tolerance):
+                regressions.append(f"{endpoint}@{rate}/s throughput {current['throughput']}/s "
+                                   f"< baseline {reference['throughput']}/s")
+            if current["errors"] + current["dropped"] > reference["errors"] + reference["dropped"]:
+                regressions.append(f"{endpoint}@{rate}/s errors {current['errors']} dropped {current['dropped']} "
+                                   f"(baseline {reference['errors']}/{reference['dropped']})")
+    return regressions
+
+def print_row(endpoint: str, result: Dict) -> None:
+    print(f"{endpoint:<8} rate={result['rate']:>7.0f}/s  throughput={result['throughput']:>8.1f}/s  "
+          f"p50={result.get('p50', 0):8.2f}ms  p99={result.get('p99', 0):8.2f}ms  p999={result.get('p999', 0):8.2f}ms  "
+          f"errors={result['errors']}  dropped={result['dropped']}")
+    if "phases" in result:
+        # Media por petición medida en el servidor: dónde se va el tiempo de cada endpoint
+        print(" " * 9 + "server " + "  ".join(f"{name}={ms:.3f}ms" for name, ms in result["phases"].items()))
+
+async def check_server_db(base_url: str, api_key: str) -> bool:
+    """Whether the server under test uses the same database as this process"""
+    async with httpx.AsyncClient(base_url=base_url, headers={"X-API-Key": api_key}, timeout=30) as client:
+        response = await client.get("/api/stats")
+    response.raise_for_status()
+    database = response.json().get("database")
+    if database != settings.MONGODB_DB:
+        print(f"the server uses database {database!r}, not {settings.MONGODB_DB!r}: "
+              f"start it with the same MONGODB_DB", file=sys.stderr)
+        return False
+    return True
+
+async def run_load(args, transport: Optional[httpx.AsyncBaseTransport], base_url: str) -> Optional[Dict]:
+    """Seed if requested and run every endpoint at every rate; None if there is nothing to load"""
+    if args.seed:
+        addresses = await seed(args.seed)
+    else:
+        docs = await proxy_collection.find({}, {"_id": 0, "ip": 1, "port": 1}).limit(100_000).to_list(length=100_000)
+        addresses = [(doc["ip"], doc["port"]) for doc in docs]
+        if not addresses:
+            print("the pool is empty, use --seed N", file=sys.stderr)
+            return None
+
+    requests = endpoint_requests(addresses)
+    rates = [float(rate) for rate in args.rates.split(",")]
+    results: Dict[str, Dict[str, Dict]] = {}
+
+    limits = httpx.Limits(max_connections=args.max_inflight, max_keepalive_connections=args.max_inflight)
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, limits=limits, timeout=30,
+                                 headers={"X-API-Key": args.api_key}) as client:
+        for endpoint in args.endpoints.split(","):
+            if args.warmup:
+                await run_rate(client, requests[endpoint], rates[0], args.warmup, args.max_inflight)
+            for rate in rates:
+                result = await run_rate(client, requests[endpoint], rate, args.duration, args.max_inflight)
+                results.setdefault(endpoint, {})[f"{rate:g}"] = result
+                print_row(endpoint, result)
+
+    if args.seed and not args.keep:
+        await proxy_collection.delete_many({"source": SEED_SOURCE})
+    return results
+
+async def main_async(args) -> int:
+    if args.seed and settings.MONGODB_DB == DEFAULT_DB and not args.allow_default_db:
+        # La siembra borra y recrea documentos: no se toca la base de datos de servicio por accidente
+        print(f"refusing to seed the default database {DEFAULT_DB!r}, set MONGODB_DB "
+              f"or pass --allow-default-db", file=sys.stderr)
+        return 2
+
+    if args.url:
+        base_url = args.url.rstrip("/")
+        if not await check_server_db(base_url, args.api_key):
+            return 2
+        results = await run_load(args, None, base_url)
+    else:
+        # La app corre en este mismo proceso y bucle: la latencia incluye al generador
+        from app.main import app, initialize_database, shutdown_event
+        await initialize_database()
+        try:
+            results = await run_load(args, httpx.ASGITransport(app=app), "http://loadtest")
+        finally:
+            # Libera el lease de escritura: otra ejecución o el servidor no esperan a que caduque
+            await shutdown_event()
+
+    if results is None:
+        return 2
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(results, indent=2))
+        print(f"baseline saved to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"no baseline at {args.baseline}, run with --save-baseline first")
+        return 0
+
+    regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance, args.slack_ms)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print("no latency regressions against the baseline")
+    return 1 if regressions else 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running server; in-process ASGI if omitted")
+    parser.add_argument("--api-key", default=settings.API_KEY)
+    parser.add_argument("--endpoints", default="proxy,proxies,report", help="Comma separated: proxy, proxies, report")
+    parser.add_argument("--rates", default="100,250,500", help="Comma separated request rates per second")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per rate")
+    parser.add_argument("--warmup", type=float, default=2, help="Seconds at the first rate discarded per endpoint")
+    parser.add_argument("--max-inflight", type=int, default=1000, help="Requests beyond this are dropped and counted")
+    parser.add_argument("--seed", type=int, default=0, help="Seed a synthetic pool of this size first")
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic pool after the run")
+    parser.add_argument("--allow-default-db", action="store_true",
+                        help=f"Allow --seed on the default database {DEFAULT_DB!r}")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    parser.add_argument("--slack-ms", type=float, default=1.0, help="Allowed absolute latency regression")
+    parser.add_argument("--output", type=Path, help="Write the results as JSON")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(main_async(args)))
+
+if __name__ == "__main__":
+    main()
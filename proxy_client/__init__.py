@@ -0,0 +1,11 @@
+"""
+Async client of the proxy service
+
+Keeps a local pool of proxies prefetched ahead of demand and reports usage
+results in background batches, so choosing and reporting a proxy adds no
+round trips to the caller's requests.
+"""
+from .client import Lease, ProxyClient, ProxyClientError
+from .session import ProxiedSession
+
+__all__ = ["Lease", "ProxiedSession", "ProxyClient", "ProxyClientError"]
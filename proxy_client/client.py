@@ -0,0 +1,363 @@
+import asyncio
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Deque, Dict, List, Optional, Set, Tuple
+import httpx
+from loguru import logger
+
+# Máximo de proxies por llamada a /api/proxies, que siempre devuelve los mejores
+MAX_POOL_SIZE = 100
+
+class ProxyClientError(Exception):
+    """Raised when no proxy can be leased"""
+
+@dataclass
+class Lease:
+    """A proxy taken from the local pool until it is released"""
+    ip: str
+    port: int
+    protocol: str = "http"
+    score: int = 0
+    released: bool = False
+
+    @property
+    def key(self) -> Tuple[str, int]:
+        return self.ip, self.port
+
+    @property
+    def url(self) -> str:
+        """Proxy URL for httpx; an "https" proxy is an HTTP proxy that supports CONNECT"""
+        scheme = "http" if self.protocol in ("http", "https") else self.protocol
+        return f"{scheme}://{self.ip}:{self.port}"
+
+class ProxyClient:
+    """
+    Async client of the proxy service with a local prefetched pool
+
+    Proxies are fetched in the background before the pool runs low, and usage
+    results are queued and sent in batches, so acquire() and release() never
+    wait on the service once the pool is warm. Failed background calls are
+    retried with exponential backoff.
+
+    Usage:
+        async with ProxyClient("http://localhost:8000", api_key) as client:
+            async with client.proxy() as lease:
+                ...  # usar lease.url; una excepción cuenta como fallo
+    """
+
+    def __init__(
+        self,
+        api_url: str,
+        api_key: str,
+        *,
+        pool_size: int = 50,
+        refill_ratio: float = 0.5,
+        min_score: int = 50,
+        protocol: Optional[str] = None,
+        diversity: Optional[str] = None,
+        max_concurrent_leases: int = 1,
+        refill_interval: float = 5.0,
+        report_batch_size: int = 100,
+        report_interval: float = 2.0,
+        max_pending_reports: int = 10_000,
+        backoff_initial: float = 0.5,
+        backoff_max: float = 30.0,
+        timeout: float = 10.0
+    ):
+        """
+        Args:
+            api_url: Base URL of the proxy service
+            api_key: Value of the X-API-Key header
+            pool_size: Proxies kept in the local pool, at most MAX_POOL_SIZE
+            refill_ratio: Fraction of pool_size below which a refill starts
+            min_score: Minimum score of fetched proxies
+            protocol: Only fetch proxies supporting this protocol
+            diversity: Spread fetched proxies across "subnet" or "asn" groups
+            max_concurrent_leases: Simultaneous leases of the same proxy
+            refill_interval: Seconds between fetches while the service has no new proxies
+            report_batch_size: Reports sent per request
+            report_interval: Seconds between report flushes
+            max_pending_reports: Oldest reports are dropped beyond this while the service is unreachable
+            backoff_initial: First retry delay in seconds
+            backoff_max: Maximum retry delay in seconds
+            timeout: Timeout of calls to the service
+        """
+        if not 1 <= pool_size <= MAX_POOL_SIZE:
+            raise ValueError(f"pool_size must be between 1 and {MAX_POOL_SIZE}")
+
+        self.api_url = api_url.rstrip("/")
+        self.pool_size = pool_size
+        self.refill_threshold = max(1, int(pool_size * refill_ratio))
+        self.min_score = min_score
+        self.protocol = protocol
+        self.diversity = diversity
+        self.max_concurrent_leases = max_concurrent_leases
+        self.refill_interval = refill_interval
+        self.report_batch_size = report_batch_size
+        self.report_interval = report_interval
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+
+        self._http = httpx.AsyncClient(
+            base_url=self.api_url,
+            headers={"X-API-Key": api_key},
+            timeout=timeout
+        )
+        # Rotación: cada préstamo mueve el proxy al final; los que fallan salen del pool
+        self._pool: Deque[Lease] = deque()
+        self._known: Set[Tuple[str, int]] = set()
+        self._active: Dict[Tuple[str, int], int] = {}
+        self._leased = 0
+        self._failed: Set[Tuple[str, int]] = set()
+        self._reports: Deque[Dict] = deque(maxlen=max_pending_reports)
+
+        self._available = asyncio.Event()
+        self._refill_needed = asyncio.Event()
+        self._flush_needed = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    async def __aenter__(self) -> "ProxyClient":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def start(self) -> None:
+        """Start the background refill and report loops"""
+        if self._tasks:
+            return
+        self._refill_needed.set()
+        self._tasks = [
+            asyncio.create_task(self._refill_loop()),
+            asyncio.create_task(self._report_loop())
+        ]
+
+    async def close(self) -> None:
+        """Stop the background loops, flushing pending reports once"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        try:
+            await self._flush()
+        except httpx.HTTPError as e:
+            logger.warning(f"Dropped {len(self._reports)} proxy reports on close: {e}")
+        await self._http.aclose()
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.backoff_max, self.backoff_initial * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.0)  # Jitter para no sincronizar reintentos
+
+    # Pool local
+
+    async def acquire(self, timeout: Optional[float] = None) -> Lease:
+        """
+        Lease a proxy from the local pool
+
+        Args:
+            timeout: Seconds to wait when the pool is empty; None waits forever
+
+        Returns:
+            Lease: The proxy, to be given back with release()
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            lease = self._take()
+            if lease is not None:
+                return lease
+
+            self._available.clear()
+            self._refill_needed.set()
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise ProxyClientError("No proxy available in the local pool")
+            try:
+                await asyncio.wait_for(self._available.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                raise ProxyClientError("No proxy available in the local pool")
+
+    def _free_slots(self) -> int:
+        return len(self._pool) * self.max_concurrent_leases - self._leased
+
+    def _take(self) -> Optional[Lease]:
+        if self._free_slots() <= 0:
+            return None
+
+        for _ in range(len(self._pool)):
+            entry = self._pool[0]
+            self._pool.rotate(-1)
+            if self._active.get(entry.key, 0) >= self.max_concurrent_leases:
+                continue
+
+            self._active[entry.key] = self._active.get(entry.key, 0) + 1
+            self._leased += 1
+            if self._free_slots() < self.refill_threshold:
+                self._refill_needed.set()
+            return Lease(ip=entry.ip, port=entry.port, protocol=entry.protocol, score=entry.score)
+        return None
+
+    def release(
+        self,
+        lease: Lease,
+        success: bool,
+        latency_ms: Optional[int] = None,
+        error: Optional[str] = None,
+        blocked: bool = False,
+        report: bool = True
+    ) -> None:
+        """
+        Give a proxy back and queue its usage result
+
+        Working proxies return to the rotation; failed ones are dropped from the
+        local pool until the service reports them as valid again. With
+        report=False the proxy is returned without sending any result.
+        """
+        if lease.released:
+            return
+        lease.released = True
+
+        # Los préstamos de un proxy ya retirado del pool no cuentan
+        active = self._active.get(lease.key, 0)
+        if active:
+            active -= 1
+            self._leased -= 1
+            if active:
+                self._active[lease.key] = active
+            else:
+                del self._active[lease.key]
+
+        if not success or blocked:
+            self._failed.add(lease.key)
+            if lease.key in self._known:
+                self._known.discard(lease.key)
+                self._pool = deque(entry for entry in self._pool if entry.key != lease.key)
+                self._leased -= self._active.pop(lease.key, 0)
+            if self._free_slots() < self.refill_threshold:
+                self._refill_needed.set()
+        self._available.set()
+
+        if not report:
+            return
+        self._reports.append({
+            "ip": lease.ip,
+            "port": lease.port,
+            "success": success,
+            "latency_ms": latency_ms,
+            "error": error,
+            "blocked_by_google": blocked
+        })
+        if len(self._reports) >= self.report_batch_size:
+            self._flush_needed.set()
+
+    @asynccontextmanager
+    async def proxy(self, timeout: Optional[float] = None) -> AsyncIterator[Lease]:
+        """Lease a proxy for a block; an exception inside it is reported as a failure, a cancellation is not reported"""
+        lease = await self.acquire(timeout)
+        try:
+            yield lease
+        except Exception as e:
+            self.release(lease, success=False, error=type(e).__name__)
+            raise
+        except BaseException:
+            # Cancelación (también la de asyncio.timeout/wait_for): el préstamo se libera sin reportar
+            self.release(lease, success=False, report=False)
+            raise
+        else:
+            self.release(lease, success=True)
+
+    def pool_stats(self) -> Dict[str, int]:
+        return {
+            "pooled": len(self._pool),
+            "leased": self._leased,
+            "pending_reports": len(self._reports),
+            "failed": len(self._failed)
+        }
+
+    # Bucles en segundo plano
+
+    async def _fetch(self) -> int:
+        params = {"min_score": self.min_score, "limit": MAX_POOL_SIZE}
+        if self.protocol:
+            params["protocol"] = self.protocol
+        if self.diversity:
+            params["diversity"] = self.diversity
+
+        response = await self._http.get("/api/proxies", params=params)
+        response.raise_for_status()
+
+        added = 0
+        for item in response.json():
+            key = (item["ip"], item["port"])
+            if key in self._known or key in self._failed:
+                continue
+            self._known.add(key)
+            self._pool.append(Lease(ip=item["ip"], port=item["port"], protocol=item.get("protocol", "http"),
+                                    score=item.get("score", 0)))
+            added += 1
+            if len(self._known) >= self.pool_size:
+                break
+
+        if added:
+            self._available.set()
+        return added
+
+    async def _refill_loop(self) -> None:
+        attempt = 0
+        while True:
+            await self._refill_needed.wait()
+            self._refill_needed.clear()
+            if len(self._pool) >= self.pool_size:
+                continue
+
+            try:
+                added = await self._fetch()
+            except (httpx.HTTPError, ValueError) as e:
+                delay = self._backoff(attempt)
+                attempt += 1
+                logger.warning(f"Proxy service unreachable, retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+                self._refill_needed.set()
+                continue
+
+            attempt = 0
+            if not added:
+                # Sin proxies nuevos: se olvidan los fallidos para que el servicio pueda devolverlos revalidados
+                self._failed.clear()
+                await asyncio.sleep(self.refill_interval)
+                self._refill_needed.set()
+
+    async def _flush(self) -> None:
+        while self._reports:
+            batch = [self._reports.popleft() for _ in range(min(self.report_batch_size, len(self._reports)))]
+            try:
+                response = await self._http.post("/api/proxy/report/batch", json=batch)
+                response.raise_for_status()
+            except (httpx.HTTPError, asyncio.CancelledError):
+                # Se devuelven a la cola en su orden original; close() cancela el bucle a mitad
+                # de un envío y los vuelve a mandar
+                self._reports.extendleft(reversed(batch))
+                raise
+
+    async def _report_loop(self) -> None:
+        attempt = 0
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_needed.wait(), timeout=self.report_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_needed.clear()
+
+            try:
+                await self._flush()
+            except httpx.HTTPError as e:
+                delay = self._backoff(attempt)
+                attempt += 1
+                logger.warning(f"Could not send {len(self._reports)} proxy reports, retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+                continue
+            attempt = 0
@@ -0,0 +1,150 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+import httpx
+
+from .client import Lease, ProxyClient, ProxyClientError
+
+class ProxiedSession:
+    """
+    httpx wrapper that leases a proxy per request and reports the outcome
+
+    One httpx.AsyncClient is kept per proxy (httpx binds proxies at client
+    creation) in a bounded LRU, so connections to a proxy are reused across
+    requests. SOCKS5 proxies need the httpx[socks] extra; leases httpx cannot
+    use (SOCKS4, or SOCKS5 without the extra) are skipped without reporting.
+
+    Usage:
+        async with ProxyClient(api_url, api_key) as client:
+            session = ProxiedSession(client)
+            response = await session.get("https://example.com")
+    """
+
+    def __init__(
+        self,
+        client: ProxyClient,
+        *,
+        max_attempts: int = 3,
+        failure_statuses: Iterable[int] = (403, 407, 429, 502, 503, 504),
+        max_clients: int = 100,
+        **httpx_kwargs
+    ):
+        """
+        Args:
+            client: ProxyClient providing the proxies
+            max_attempts: Proxies tried per request before giving up
+            failure_statuses: Response statuses that count as a proxy failure and are retried
+            max_clients: httpx clients kept open, one per proxy
+            httpx_kwargs: Extra arguments for every httpx.AsyncClient (timeout, headers, ...)
+        """
+        self.client = client
+        self.max_attempts = max_attempts
+        self.failure_statuses = set(failure_statuses)
+        self.max_clients = max_clients
+        self.httpx_kwargs = httpx_kwargs
+        self._clients: "OrderedDict[str, httpx.AsyncClient]" = OrderedDict()
+        # Peticiones en curso por cliente: uno desalojado o descartado se cierra al terminar la última
+        self._in_use: Dict[httpx.AsyncClient, int] = {}
+
+    async def __aenter__(self) -> "ProxiedSession":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        while self._clients:
+            _, http = self._clients.popitem()
+            await http.aclose()
+
+    async def _client_for(self, lease: Lease) -> httpx.AsyncClient:
+        """Client for the lease's proxy, counted as in use until _done_with() is called"""
+        http = self._clients.pop(lease.url, None)
+        if http is None:
+            http = httpx.AsyncClient(proxy=lease.url, **self.httpx_kwargs)
+        self._clients[lease.url] = http
+
+        while len(self._clients) > self.max_clients:
+            _, evicted = self._clients.popitem(last=False)
+            await self._close_if_idle(evicted)
+        self._in_use[http] = self._in_use.get(http, 0) + 1
+        return http
+
+    async def _close_if_idle(self, http: httpx.AsyncClient) -> None:
+        if not self._in_use.get(http):
+            await http.aclose()
+
+    async def _done_with(self, lease: Lease, http: httpx.AsyncClient) -> None:
+        count = self._in_use.pop(http) - 1
+        if count:
+            self._in_use[http] = count
+        elif self._clients.get(lease.url) is not http:
+            # Desalojado o descartado mientras se usaba
+            await http.aclose()
+
+    async def _drop_client(self, lease: Lease) -> None:
+        http = self._clients.pop(lease.url, None)
+        if http is not None:
+            await self._close_if_idle(http)
+
+    async def request(self, method: str, url: str, *, lease_timeout: Optional[float] = None, **kwargs) -> httpx.Response:
+        """
+        Send a request through a leased proxy, retrying on other proxies
+
+        Args:
+            method: HTTP method
+            url: Target URL
+            lease_timeout: Seconds to wait for a proxy from the local pool
+            kwargs: Passed to httpx.AsyncClient.request
+
+        Returns:
+            httpx.Response: The first response not attributed to a proxy failure,
+                or the last one received
+        """
+        last_error: Optional[Exception] = None
+        response: Optional[httpx.Response] = None
+
+        for _ in range(self.max_attempts):
+            lease = await self.client.acquire(lease_timeout)
+            try:
+                http = await self._client_for(lease)
+            except (ValueError, ImportError) as e:
+                # Protocolo que httpx no admite: se retira del pool local sin culpar al proxy
+                self.client.release(lease, success=False, report=False)
+                last_error = e
+                continue
+            except BaseException:
+                self.client.release(lease, success=True, report=False)
+                raise
+
+            start = time.monotonic()
+            try:
+                response = await http.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                self.client.release(lease, success=False, error=type(e).__name__)
+                await self._drop_client(lease)
+                last_error = e
+                continue
+            except BaseException:
+                # Errores ajenos al proxy (cancelación, argumentos...): se devuelve sin reportar fallo
+                self.client.release(lease, success=True, report=False)
+                raise
+            finally:
+                await self._done_with(lease, http)
+
+            latency_ms = int((time.monotonic() - start) * 1000)
+            if response.status_code in self.failure_statuses:
+                self.client.release(lease, success=False, latency_ms=latency_ms, error=f"HTTP {response.status_code}")
+            else:
+                self.client.release(lease, success=True, latency_ms=latency_ms)
+                return response
+
+        if response is not None:
+            return response
+        raise ProxyClientError(f"Request failed through {self.max_attempts} proxies: {last_error}")
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)